@@ -0,0 +1,153 @@
+import pandas as pd
+
+
+SPENDING_COLUMNS = ["Date", "Description", "Amount", "Category"]
+
+
+def prepare_transactions(df):
+    """Coerce the spending history columns to usable dtypes and drop unparseable rows."""
+    df = df.copy()
+    df["Date"] = pd.to_datetime(df["Date"], errors="coerce")
+    df["Amount"] = pd.to_numeric(df["Amount"], errors="coerce")
+    df = df.dropna(subset=["Date", "Amount"])
+    category = df["Category"] if "Category" in df else pd.Series(pd.NA, index=df.index, dtype="object")
+    df["Category"] = category.fillna("Uncategorised").astype(str).str.strip()
+    if "Description" not in df:
+        df["Description"] = ""
+    return df
+
+
+class SpendingAggregator:
+    """Running per-period, per-category sums and counts that can be folded chunk by chunk.
+
+    Memory is bounded by the number of (period, category) pairs, not by the number of rows,
+    so arbitrarily long histories can be summarised from fixed-size chunks.
+    """
+
+    def __init__(self, freq="M"):
+        self.freq = freq
+        self.transactions = 0
+        self.start = None
+        self.end = None
+        self._totals = None
+
+    @classmethod
+    def from_totals(cls, totals, transactions, start, end, freq="M"):
+        """Rebuild an aggregator from stored ``(Period, Category) -> sum, count`` totals."""
+        aggregator = cls(freq)
+        if len(totals):
+            aggregator._totals = totals
+            aggregator.transactions = transactions
+            aggregator.start = start
+            aggregator.end = end
+        return aggregator
+
+    def update(self, df):
+        """Fold one chunk of raw transactions into the running aggregates."""
+        df = prepare_transactions(df)
+        if df.empty:
+            return self
+        period = df["Date"].dt.to_period(self.freq).rename("Period")
+        chunk = SpendingAggregator(self.freq)
+        chunk.transactions = len(df)
+        chunk.start = df["Date"].min()
+        chunk.end = df["Date"].max()
+        chunk._totals = df.groupby([period, "Category"])["Amount"].agg(["sum", "count"])
+        return self.merge(chunk)
+
+    def merge(self, other):
+        """Combine another aggregator (e.g. a chunk's) into this one."""
+        if other._totals is None:
+            return self
+        if self._totals is None:
+            self._totals = other._totals.copy()
+        else:
+            self._totals = self._totals.add(other._totals, fill_value=0)
+        self.transactions += other.transactions
+        self.start = other.start if self.start is None else min(self.start, other.start)
+        self.end = other.end if self.end is None else max(self.end, other.end)
+        return self
+
+    def summary(self):
+        """Return per-category and per-period aggregates in the shape produced by summarize_spending."""
+        summary = {
+            "freq": self.freq,
+            "transactions": self.transactions,
+            "total": 0.0,
+            "start": self.start,
+            "end": self.end,
+            "by_category": None,
+            "by_period": None,
+            "category_by_period": None,
+            "mom": None,
+            "mom_periods": None,
+        }
+        if self._totals is None:
+            return summary
+
+        totals = self._totals
+        by_category = totals.groupby(level="Category").sum()
+        by_category = pd.DataFrame(
+            {"total": by_category["sum"], "count": by_category["count"], "mean": by_category["sum"] / by_category["count"]}
+        ).sort_values("total", ascending=False)
+        by_period = totals.groupby(level="Period").sum()
+        by_period = pd.DataFrame(
+            {"total": by_period["sum"], "count": by_period["count"], "mean": by_period["sum"] / by_period["count"]}
+        )
+        category_by_period = totals["sum"].unstack(fill_value=0.0).sort_index()
+
+        # Month-over-month deltas compare the last two periods for every category at once
+        if len(category_by_period) >= 2:
+            previous = category_by_period.iloc[-2]
+            current = category_by_period.iloc[-1]
+            delta = current - previous
+            pct = (delta / previous.where(previous != 0)) * 100
+            mom = pd.DataFrame({"previous": previous, "current": current, "delta": delta, "pct": pct})
+            summary["mom"] = mom.reindex(delta.abs().sort_values(ascending=False).index)
+            summary["mom_periods"] = tuple(str(p) for p in category_by_period.index[-2:])
+
+        summary.update(
+            total=float(by_category["total"].sum()),
+            by_category=by_category,
+            by_period=by_period,
+            category_by_period=category_by_period,
+        )
+        return summary
+
+
+def summarize_spending(df, freq="M"):
+    """Compute per-category and per-period aggregates for a spending history frame."""
+    return SpendingAggregator(freq).update(df).summary()
+
+
+def format_summary(summary):
+    """Render a spending summary as compact text for the agent prompt."""
+    if summary["transactions"] == 0:
+        return "No valid transactions found in the uploaded history."
+
+    lines = [
+        f"Transactions: {summary['transactions']} "
+        f"({summary['start']:%Y-%m-%d} to {summary['end']:%Y-%m-%d}), "
+        f"total spent {summary['total']:,.2f}",
+        "",
+        "By category (total / count / mean):",
+    ]
+    for category, row in summary["by_category"].iterrows():
+        lines.append(f"- {category}: {row['total']:,.2f} / {int(row['count'])} / {row['mean']:,.2f}")
+
+    lines += ["", f"By period ({summary['freq']}):"]
+    for period, row in summary["by_period"].iterrows():
+        lines.append(
+            f"- {period}: total {row['total']:,.2f} / {int(row['count'])} txns / mean {row['mean']:,.2f}"
+        )
+
+    if summary["mom"] is not None:
+        previous, current = summary["mom_periods"]
+        lines += ["", f"Period-over-period change by category ({previous} -> {current}):"]
+        for category, row in summary["mom"].iterrows():
+            change = f"{row['delta']:+,.2f}"
+            if pd.notna(row["pct"]):
+                change += f" ({row['pct']:+.1f}%)"
+            lines.append(f"- {category}: {row['previous']:,.2f} -> {row['current']:,.2f}, {change}")
+
+    return "\n".join(lines)
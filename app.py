@@ -1,11 +1,11 @@
-àimport streamlit as st
+import streamlit as st
 import os
-import asyncio
-from agents import Agent, Runner, RunConfig
-from agents.models.openai_provider import OpenAIProvider
-from openai import AsyncOpenAI
+from agents import Runner
 from dotenv import load_dotenv
 
+from resources import get_agent, get_provider, get_run_config, iterate_on_loop
+from streaming import stream_text, write_stream
+
 load_dotenv(override=True)
 
 
@@ -19,17 +19,11 @@ if "OPENROUTER_API_KEY" not in os.environ:
     st.error("FATAL: OPENROUTER_API_KEY environment variable not set.")
     st.stop()
 
-# 2. Create a custom AsyncOpenAI client for OpenRouter
-openrouter_client = AsyncOpenAI(
-    base_url="https://openrouter.ai/api/v1",
-    api_key=os.environ["OPENROUTER_API_KEY"],
-)
-
-# 3. Wrap the client in an OpenAIProvider
-openrouter_provider = OpenAIProvider(openai_client=openrouter_client)
+# 2. The OpenRouter client and provider live in resources.py: built once per process and kept warm across reruns
+get_provider()
 
-# Define your agent
-task_generator = Agent(
+# Define your agent (built on the first run, then reused)
+task_generator = get_agent(
     name="Task Generator",
     instructions="""You are an AI-powered budget management agent.
     Your persona is that of a precise, data-driven, and supportive financial analyst. 
@@ -124,11 +118,11 @@ Proactive Check-ins: Initiate periodic check-ins (e.g., weekly) to request updat
 
 # Async wrapper for running the agent with the correct provider
 async def generate_tasks(goal):
-    # 4. Pass the provider to the runner via RunConfig
+    # 4. Pass the shared provider to the runner via RunConfig
     result = await Runner.run(
         task_generator, 
         goal, 
-        run_config=RunConfig(model_provider=openrouter_provider)
+        run_config=get_run_config()
     )
     return result.final_output
 
@@ -143,8 +137,10 @@ if st.button("Generate Budget"):
     if user_goal.strip() == "":
         st.warning("Please enter income, expenses, financial goals, and spending history.")
     else:
-        with st.spinner("Generating your budget plan..."):
-            tasks = asyncio.run(generate_tasks(user_goal))
-            st.success("Here a suggested budget:")
-
-            st.markdown(f"```text\n{tasks}\n```")
+        st.success("Here a suggested budget:")
+        # Stream tokens into the placeholder so the first words show up immediately
+        tasks = write_stream(
+            iterate_on_loop(stream_text(task_generator, user_goal, run_config=get_run_config())),
+            st.empty(),
+            render=lambda text: f"```text\n{text}\n```",
+        )
@@ -0,0 +1,131 @@
+import asyncio
+import json
+import os
+import random
+import time
+from pathlib import Path
+
+from openai import APIConnectionError, APIStatusError, APITimeoutError
+
+from analytics import format_summary
+from budget_agent import BUDGET_INSTRUCTIONS, build_prompt, generate_tasks
+from dispatcher import PRIORITY_BATCH
+from ingest import ingest_with_categories
+from metrics import metrics
+from patterns import format_patterns
+from prompt_planner import prompt_token_budget
+
+
+RETRYABLE_STATUS_CODES = {429, 500, 502, 503, 504}
+PROGRESS_FILE = "progress.jsonl"
+
+
+def is_retryable(exc):
+    """Rate limits, server errors and dropped connections are worth retrying; anything else is not."""
+    if isinstance(exc, (APIConnectionError, APITimeoutError)):
+        return True
+    if isinstance(exc, APIStatusError):
+        return exc.status_code in RETRYABLE_STATUS_CODES
+    return False
+
+
+async def with_retries(make_call, retries=5, base_delay=1.0, max_delay=60.0):
+    """Await ``make_call()``, retrying retryable errors with jittered exponential backoff."""
+    for attempt in range(retries + 1):
+        try:
+            return await make_call()
+        except Exception as exc:
+            if attempt == retries or not is_retryable(exc):
+                raise
+            metrics.count("retries")
+            delay = min(max_delay, base_delay * 2 ** attempt)
+            await asyncio.sleep(delay * random.uniform(0.5, 1.0))
+
+
+def load_progress(output_dir):
+    """Return the names of input files already reported in a previous (possibly interrupted) run."""
+    path = Path(output_dir) / PROGRESS_FILE
+    done = set()
+    if not path.exists():
+        return done
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                continue  # a torn final line from an interrupted run
+            if record.get("status") == "done":
+                done.add(record["file"])
+    return done
+
+
+def record_progress(output_dir, record):
+    with open(Path(output_dir) / PROGRESS_FILE, "a", encoding="utf-8") as f:
+        f.write(json.dumps(record) + "\n")
+
+
+def write_report(output_dir, name, report):
+    """Write one report atomically so a crash never leaves a half-written file behind."""
+    path = Path(output_dir) / f"{Path(name).stem}.md"
+    tmp_path = path.with_suffix(".md.tmp")
+    tmp_path.write_text(report, encoding="utf-8")
+    os.replace(tmp_path, path)
+    return path
+
+
+def prompt_for_file(path):
+    """Build the budget prompt for one spending-history CSV.
+
+    Missing categories are labelled as in the app: locally first, then the leftovers in one
+    agent request at batch priority. The summary and the pattern findings come from the same
+    chunked pass.
+    """
+    history = ingest_with_categories(path, priority=PRIORITY_BATCH)
+    for warning in history["warnings"]:
+        print(f"{Path(path).name}: {warning}")
+    return build_prompt(
+        "",
+        "",
+        "",
+        format_summary(history["summary"]),
+        token_budget=prompt_token_budget(BUDGET_INSTRUCTIONS),
+        detected_patterns=format_patterns(history["findings"]),
+    )
+
+
+async def run_batch(input_dir, output_dir, max_in_flight=8, retries=5, pattern="*.csv", generate=None):
+    """Generate a report for every CSV in ``input_dir`` with at most ``max_in_flight`` concurrent requests.
+
+    Reports are written to ``output_dir`` as soon as each one finishes, and completed
+    files are recorded so a rerun after an interruption only processes what is left.
+    By default requests are queued at batch priority, behind interactive reports.
+    """
+    generate = generate or (lambda prompt: generate_tasks(prompt, priority=PRIORITY_BATCH))
+    os.makedirs(output_dir, exist_ok=True)
+    done = load_progress(output_dir)
+    files = [path for path in sorted(Path(input_dir).glob(pattern)) if path.name not in done]
+    semaphore = asyncio.Semaphore(max_in_flight)
+    counts = {"done": 0, "failed": 0, "skipped": len(done)}
+    total = len(files)
+
+    async def process(path):
+        started = time.perf_counter()
+        try:
+            async with semaphore:
+                with metrics.report("batch"):
+                    with metrics.stage("csv_parse"):
+                        prompt = await asyncio.to_thread(prompt_for_file, path)
+                    report = await with_retries(lambda: generate(prompt), retries=retries)
+            await asyncio.to_thread(write_report, output_dir, path.name, report)
+        except Exception as exc:
+            counts["failed"] += 1
+            record_progress(output_dir, {"file": path.name, "status": "failed", "error": repr(exc)})
+            print(f"[{counts['done'] + counts['failed']}/{total}] {path.name} failed: {exc}")
+            return
+        elapsed = time.perf_counter() - started
+        counts["done"] += 1
+        record_progress(output_dir, {"file": path.name, "status": "done", "seconds": round(elapsed, 3)})
+        print(f"[{counts['done'] + counts['failed']}/{total}] {path.name} done ({elapsed:.1f}s)")
+
+    await asyncio.gather(*(process(path) for path in files))
+    return counts
@@ -0,0 +1,193 @@
+import argparse
+import asyncio
+import io
+import json
+import os
+import platform
+import subprocess
+import tempfile
+import time
+from datetime import datetime
+from pathlib import Path
+
+from agents import RunConfig
+
+from analytics import format_summary
+from batch import run_batch
+from budget_agent import BUDGET_FALLBACK_MODELS, BUDGET_MODEL, build_prompt, generate_tasks, get_budget_agent
+from dispatcher import PRIORITY_BATCH, Dispatcher
+from ingest import ingest_csv
+from mock_provider import MockModelProvider
+from patterns import detect_patterns, format_patterns
+from prompt_planner import count_tokens
+from metrics import RollingHistogram
+from resources import run_coroutine
+from router import ModelRouter
+from synthetic import generate_history
+
+
+def git_revision():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def bench_ingestion(rows):
+    """Time chunked ingestion and prompt building for a synthetic history of ``rows`` transactions."""
+    df = generate_history(rows)
+    csv_text = df.to_csv(index=False)
+
+    started = time.perf_counter()
+    history = ingest_csv(io.StringIO(csv_text))
+    ingest_seconds = time.perf_counter() - started
+
+    started = time.perf_counter()
+    findings = detect_patterns(df)
+    patterns_seconds = time.perf_counter() - started
+
+    started = time.perf_counter()
+    prompt = build_prompt("", "", "", format_summary(history["summary"]), detected_patterns=format_patterns(findings))
+    prompt_seconds = time.perf_counter() - started
+
+    return {
+        "rows": rows,
+        "csv_bytes": len(csv_text),
+        "ingest_seconds": ingest_seconds,
+        "rows_per_second": rows / ingest_seconds if ingest_seconds else None,
+        "detect_patterns_seconds": patterns_seconds,
+        "build_prompt_seconds": prompt_seconds,
+        "prompt_chars": len(prompt),
+        "prompt_tokens": count_tokens(prompt),
+    }, prompt
+
+
+async def bench_report_latency(prompt, run_config, repeats):
+    """End-to-end latency of single reports against the mock provider."""
+    latencies = []
+    for _ in range(repeats):
+        started = time.perf_counter()
+        await generate_tasks(prompt, run_config=run_config)
+        latencies.append(time.perf_counter() - started)
+    latencies.sort()
+    return {"repeats": repeats, "min_seconds": latencies[0], "median_seconds": latencies[len(latencies) // 2]}
+
+
+async def bench_throughput(run_config, reports, concurrency, rows):
+    """Reports per second through the batch scheduler at a given concurrency limit."""
+    with tempfile.TemporaryDirectory() as tmp:
+        input_dir, output_dir = Path(tmp, "in"), Path(tmp, "out")
+        input_dir.mkdir()
+        for index in range(reports):
+            generate_history(rows, seed=index).to_csv(input_dir / f"customer_{index:05d}.csv", index=False)
+
+        started = time.perf_counter()
+        counts = await run_batch(
+            input_dir,
+            output_dir,
+            max_in_flight=concurrency,
+            generate=lambda prompt: generate_tasks(prompt, run_config=run_config, priority=PRIORITY_BATCH),
+        )
+        elapsed = time.perf_counter() - started
+    return {
+        "concurrency": concurrency,
+        "reports": reports,
+        "done": counts["done"],
+        "seconds": elapsed,
+        "reports_per_second": counts["done"] / elapsed if elapsed else None,
+    }
+
+
+async def bench_hedging(args, requests, wave=10):
+    """Report latency percentiles with and without hedging when the primary model has a latency tail."""
+    provider = MockModelProvider(
+        latency=args.latency,
+        tokens_per_second=1_000.0,
+        output_tokens=40,
+        slow_fractions={BUDGET_MODEL: args.slow_fraction},
+    )
+    run_config = RunConfig(model_provider=provider)
+    agent = get_budget_agent()
+    results = {}
+    for label, quantile in (("primary_only", None), ("hedged_p95", 0.95)):
+        # Primaries run outside any dispatcher here, so hedges only need headroom for themselves
+        router = ModelRouter(hedge_quantile=quantile, dispatcher=Dispatcher(max_in_flight=wave, requests_per_minute=0))
+        latencies = RollingHistogram(window=requests)
+
+        async def one():
+            started = time.perf_counter()
+            await router.run(agent, "benchmark", run_config, models=[BUDGET_MODEL, *BUDGET_FALLBACK_MODELS])
+            latencies.observe(time.perf_counter() - started)
+
+        for start in range(0, requests, wave):
+            await asyncio.gather(*(one() for _ in range(min(wave, requests - start))))
+        results[label] = {f"p{int(q * 100)}_seconds": v for q, v in latencies.percentiles().items()}
+    return {"requests": requests, "slow_fraction": args.slow_fraction, **results}
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Offline benchmarks for the budget manager (no API key needed).")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[100, 1_000, 10_000, 100_000, 1_000_000])
+    parser.add_argument("--latency", type=float, default=0.5, help="Mock time to first token, in seconds.")
+    parser.add_argument("--tokens-per-second", type=float, default=80.0, help="Mock output speed.")
+    parser.add_argument("--output-tokens", type=int, default=600, help="Mock report length in tokens.")
+    parser.add_argument("--repeats", type=int, default=3, help="Single-report latency samples.")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 4, 16])
+    parser.add_argument("--reports", type=int, default=32, help="Reports per throughput run.")
+    parser.add_argument("--hedge-requests", type=int, default=200, help="Requests per hedging run (0 to skip).")
+    parser.add_argument("--slow-fraction", type=float, default=0.05, help="Share of primary requests that stall.")
+    parser.add_argument("--output", default="benchmark_results.json")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    # The mock provider has no quota: lift the dispatcher's rate limit and size it to the concurrency runs
+    os.environ.setdefault("OPENROUTER_REQUESTS_PER_MINUTE", "0")
+    os.environ.setdefault("OPENROUTER_MAX_CONNECTIONS", str(max(args.concurrency + [20])))
+    run_config = RunConfig(
+        model_provider=MockModelProvider(
+            latency=args.latency, tokens_per_second=args.tokens_per_second, output_tokens=args.output_tokens
+        )
+    )
+    results = {
+        "revision": git_revision(),
+        "timestamp": datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "mock_model": {
+            "latency": args.latency,
+            "tokens_per_second": args.tokens_per_second,
+            "output_tokens": args.output_tokens,
+        },
+        "ingestion": [],
+    }
+
+    prompt = ""
+    for rows in args.sizes:
+        result, prompt = bench_ingestion(rows)
+        results["ingestion"].append(result)
+        print(f"ingest {rows:>9} rows: {result['ingest_seconds']:.3f}s, prompt {result['prompt_tokens']} tokens")
+
+    results["report_latency"] = run_coroutine(bench_report_latency(prompt, run_config, args.repeats))
+    print(f"report latency: median {results['report_latency']['median_seconds']:.2f}s")
+
+    results["throughput"] = []
+    for concurrency in args.concurrency:
+        result = run_coroutine(bench_throughput(run_config, args.reports, concurrency, rows=200))
+        results["throughput"].append(result)
+        print(f"concurrency {concurrency:>3}: {result['reports_per_second']:.2f} reports/s")
+
+    if args.hedge_requests:
+        results["hedging"] = run_coroutine(bench_hedging(args, args.hedge_requests))
+        for label in ("primary_only", "hedged_p95"):
+            print(f"{label}: p95 {results['hedging'][label]['p95_seconds']:.2f}s")
+
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(results, f, indent=2)
+    print(f"--- Results written to {args.output} ---")
+
+
+if __name__ == "__main__":
+    main()
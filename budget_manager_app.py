@@ -1,13 +1,33 @@
 import streamlit as st
 import os
-import asyncio
-import pandas as pd
 import io
-from agents import Agent, Runner, RunConfig
-from agents.models.openai_provider import OpenAIProvider
-from openai import AsyncOpenAI
+import hashlib
+import math
 from dotenv import load_dotenv
 
+from analytics import format_summary
+from budget_agent import generate_tasks, get_budget_agent, plan_prompt
+from categorizer import MerchantCategorizer
+from dispatcher import get_dispatcher
+from ingest import (
+    PREVIEW_PAGE_SIZE,
+    ingest_with_categories,
+    load_transactions,
+    map_reduce_history,
+    needs_map_reduce,
+    read_page,
+)
+from metrics import metrics
+from patterns import detect_patterns, format_patterns
+from prompt_planner import count_tokens, format_compression, parse_history_text, prompt_token_budget
+from report_pipeline import generate_report
+from resources import get_provider, get_run_config, iterate_on_loop, run_coroutine
+from response_cache import ResponseCache, cache_key
+from router import get_router
+from spending_tools import SpendingTools
+from store import TransactionStore, format_incremental_history
+from streaming import stream_text, write_stream
+
 load_dotenv(override=True)
 
 # 1. Check for the OpenRouter API key
@@ -15,102 +35,108 @@ if "OPENROUTER_API_KEY" not in os.environ:
     st.error("FATAL: OPENROUTER_API_KEY environment variable not set.")
     st.stop()
 
-# 2. Create a custom AsyncOpenAI client for OpenRouter
-openrouter_client = AsyncOpenAI(
-    base_url="https://openrouter.ai/api/v1",
-    api_key=os.environ["OPENROUTER_API_KEY"],
-)
-
-# 3. Wrap the client in an OpenAIProvider
-openrouter_provider = OpenAIProvider(openai_client=openrouter_client)
-
-# Define your agent
-task_generator = Agent(
-    name="Task Generator",
-    instructions="""You are an AI-powered budget management agent.
-    Your persona is that of a precise, data-driven, and supportive financial analyst. 
-    You are encouraging but always ground your insights in the data provided. 
-    You are a tool for empowerment, helping users gain objective clarity on their financial habits.
-
-Your primary directive is to transform user-provided financial data into a structured, actionable budget and provide data-driven insights to help users achieve their financial goals. You will execute this by following a clear, cyclical process:
-
-1. Ingest & Categorize: Receive and parse user-provided income and expense data. Automatically categorize transactions based on common patterns (e.g., "Starbucks" -> "Coffee Shops"), and ask for clarification if a category is ambiguous.
-
-2. Budget Generation: Based on the user's stated financial goals (e.g., "save $500/month"), generate a personalized weekly or monthly budget. The budget must clearly allocate funds to fixed costs, variable spending, and savings.
+# 2. The OpenRouter client and provider live in resources.py: built once per process and kept warm across reruns
+get_provider()
 
-3. Spending Analysis: Continuously analyze spending patterns against the established budget. Identify and quantify variances (e.g., "You spent $50 over your 'Dining Out' budget this week").
+# Define your agent (built on the first run, then reused)
+task_generator = get_budget_agent()
 
-4. Formulate Recommendations: Generate specific, actionable recommendations for budget adherence. Prioritize recommendations based on the biggest impact on the user's goals.
 
-5. Reporting: Deliver insights through structured, easy-to-read reports with clear visualizations.
+@st.cache_resource
+def get_response_cache():
+    """One response cache per process so it survives Streamlit reruns."""
+    return ResponseCache()
 
-You must be capable of parsing the following input types from the user. Data may be provided in natural language or as structured lists.
 
-Data Field | Type | Description & Examples
-income_sources | List of Objects | Each object contains source (string, e.g., "Monthly Salary") and amount (number).
-expense_items | List of Objects | Each object contains item (string, e.g., "Netflix Subscription"), amount (number), and category (string, e.g., "Entertainment").
-financial_goals | List of Objects | Each object contains goal (string, e.g., "Save for vacation") and target_amount (number).
-spending_history | Text/CSV | Raw text or CSV data of past transactions for initial analysis.
+async def generate_tasks_cached(prompt, agent=None, data_fingerprint=""):
+    """Serve repeated reports from the response cache, falling back to generate_tasks.
 
-All responses must be in well-structured Markdown. Your primary output will be a Budget Health Report, which must contain the following sections in this order:
+    ``data_fingerprint`` identifies data the agent reads through tools rather than the prompt.
+    """
+    agent = agent or task_generator
+    key = cache_key(prompt + data_fingerprint, agent.instructions, agent.model)
+    return await get_response_cache().get_or_generate(key, lambda: generate_tasks(prompt, agent=agent))
 
-1. ## Budget Overview: A top-level summary table showing Total Income, Total Expenses, and Net Savings for the period.
 
-2. ## Spending Analysis: A detailed breakdown of spending by category, presented in a table with columns for Category, Budgeted Amount, Actual Spent, and Variance. Use ASCII bar charts or similar simple visualizations within the table if possible.
-
-3. ## Key Insights & Recommendations: A numbered list of 2-3 specific, data-driven insights. Each insight should be followed by a concrete recommendation. (e.g., "Insight: You spent 30% more on ride-sharing this month than last. Recommendation: Consider using public transport for your daily commute to save an estimated $80/month.")
+def stream_tasks_cached(prompt, placeholder, agent=None, data_fingerprint=""):
+    """Stream the report into ``placeholder`` token by token, or render it straight from the cache."""
+    agent = agent or task_generator
+    key = cache_key(prompt + data_fingerprint, agent.instructions, agent.model)
+    report = get_response_cache().get_or_compute(
+        key,
+        lambda: write_stream(
+            iterate_on_loop(stream_text(agent, prompt, run_config=get_run_config())),
+            placeholder,
+        ),
+    )
+    placeholder.markdown(report)
+    return report
 
-4. ## Goal Progress: A status update on the user's progress toward their stated financial goals.
 
-Your tone must be consistently encouraging and objective. Frame insights as observations, not judgments.
+@st.cache_resource
+def get_transaction_store():
+    """Persistent transaction store shared across reruns and sessions (scoped per account on use)."""
+    return TransactionStore()
 
-MUST NOT Provide Financial Advice: Under no circumstances will you provide advice that constitutes professional investment, tax, or legal guidance. If a user asks for such advice, you MUST respond with: "As an AI agent, I cannot provide financial advice. Please consult a certified financial professional for guidance on investments, taxes, or legal matters."
 
-MUST NOT Handle Real Assets: You are forbidden from integrating with bank accounts, making payments, or executing any real-world financial transactions.
+def signed_in_user():
+    """The signed-in user's email when Streamlit authentication is configured, else None."""
+    user = getattr(st, "user", None)
+    if user is not None and getattr(user, "is_logged_in", False):
+        return getattr(user, "email", None)
+    return None
 
-MUST NOT Make Unrealistic Projections: All savings projections and financial outcomes must be based directly on the data provided. Do not speculate or make promises.
 
-MUST NOT Store PII: You are forbidden from requesting or storing Personally Identifiable Information (PII) beyond what is necessary for budget categorization (e.g., transaction descriptions). You must never ask for account numbers, social security numbers, or addresses.
+def session_account():
+    """Store key for this visitor, or None when their uploads should not be kept at all.
 
-Core Directives & Capabilities:
+    The signed-in user when auth is configured; otherwise the private history key the visitor
+    entered (hashed), so the same key on a later visit finds the same rows and report watermark.
+    """
+    email = signed_in_user()
+    if email:
+        return f"user:{email}"
+    history_key = st.session_state.get("history_key", "").strip()
+    if history_key:
+        return f"key:{hashlib.sha256(history_key.encode()).hexdigest()}"
+    return None
 
-- Data-Driven First: Your primary directive is to base every single analysis, insight, and recommendation on the numerical data provided by the user. Do not rely on generalized financial advice.
-- Default to Clarification: If any user input is ambiguous or a transaction is difficult to categorize, you MUST ask clarifying questions before proceeding. Do not make assumptions.
-- Maintain Persona: You must consistently adhere to the persona defined above. Your responses should always be precise, data-driven, and supportive.
-- Utilize Web Search for Context: You are permitted to use web search to gather general information on budgeting principles, savings strategies, or to understand a transaction item better, but not for providing specific financial advice.
-- Proactive Check-ins: Initiate periodic check-ins (e.g., weekly) to request updated spending data and provide a new report, helping the user stay engaged with their budget.
-""",
-    model="openai/gpt-3.5-turbo",
-)
 
+def get_account_store():
+    """This visitor's rows, totals and report watermark; other sessions' uploads are never visible."""
+    return get_transaction_store().for_account(session_account())
 
-# Async wrapper for running the agent with the correct provider
-async def generate_tasks(prompt):
-    result = await Runner.run(
-        task_generator,
-        prompt,
-        run_config=RunConfig(model_provider=openrouter_provider)
-    )
-    return result.final_output
 
+@st.cache_data(show_spinner=False)
+def ingest_upload(file_id, account, _uploaded_file):
+    """Stream an upload into running aggregates (and ``account``'s store) once; later reruns reuse the result.
 
-def build_prompt(income, expenses, goals, spending_history_text):
-    """Assemble a structured prompt from the four separate input fields."""
-    sections = []
+    Without an account the rows are summarised in memory only and nothing is written to disk.
+    """
+    store = get_transaction_store().for_account(account) if account else None
+    with metrics.stage("csv_parse"):
+        return ingest_with_categories(_uploaded_file, store=store)
 
-    if income.strip():
-        sections.append(f"## Income Sources\n{income.strip()}")
 
-    if expenses.strip():
-        sections.append(f"## Expense Items\n{expenses.strip()}")
+def get_spending_tools(file_id, uploaded_file, rules):
+    """One tool set per session and upload, so its memoised query results survive reruns.
 
-    if goals.strip():
-        sections.append(f"## Financial Goals\n{goals.strip()}")
+    ``rules`` are the categoriser rules from ingestion (including agent-labelled merchants), so
+    tool figures use the same categories as the summary and the store.
+    """
+    key = f"spending_tools_{file_id}"
+    if key not in st.session_state:
+        with metrics.stage("csv_parse"):
+            st.session_state[key] = SpendingTools(
+                load_transactions(uploaded_file, categorizer=MerchantCategorizer(rules=rules))
+            )
+    return st.session_state[key]
 
-    if spending_history_text.strip():
-        sections.append(f"## Spending History\n{spending_history_text.strip()}")
 
-    return "\n\n".join(sections)
+@st.cache_data(show_spinner=False)
+def condense_upload(file_id, _history):
+    """Map-reduce a history whose local summary is still too long, once per upload."""
+    return run_coroutine(map_reduce_history(_history))
 
 
 # ─── Streamlit UI ─────────────────────────────────────────────────────────────
@@ -167,14 +193,51 @@ uploaded_file = st.file_uploader(
 )
 
 spending_history_text = ""
+history_summary = None
+findings = []
+incremental = False
+spending_tools = None
 
 if uploaded_file is not None:
+    if not signed_in_user():
+        st.text_input(
+            "Private history key (optional)",
+            key="history_key",
+            type="password",
+            help="Enter the same key on your next visit to compare new uploads with your previous report. "
+            "Without a key, nothing from this upload is kept after the session.",
+        )
+    account = session_account()
     try:
-        df = pd.read_csv(uploaded_file)
-        st.success(f"CSV uploaded successfully — {len(df)} transactions detected.")
-        st.dataframe(df, use_container_width=True)
-        # Convert the dataframe back to CSV text to pass to the agent
-        spending_history_text = df.to_csv(index=False)
+        history = ingest_upload(uploaded_file.file_id, account, uploaded_file)
+        history_summary = history["summary"]
+        stored = f", {history['new_rows']} not seen before" if account else ""
+        st.success(f"CSV uploaded successfully — {history['rows']} transactions detected{stored}.")
+        for warning in history["warnings"]:
+            st.warning(warning + " Re-upload the file to try again.")
+        use_tools = st.toggle("Let the agent look up figures from the full history with tools", value=False)
+        incremental = not use_tools and st.toggle(
+            "Only analyse transactions added since the previous report",
+            value=False,
+            disabled=account is None,
+            help=None if account else "Sign in or enter a private history key to keep history between visits.",
+        )
+        # Preview one page at a time instead of rendering every row
+        pages = max(1, math.ceil(history["rows"] / PREVIEW_PAGE_SIZE))
+        page = st.number_input(f"Preview page (of {pages})", min_value=1, max_value=pages, value=1)
+        st.dataframe(read_page(uploaded_file, page - 1), use_container_width=True)
+        findings = history["findings"]
+        # Summarise the history locally so the prompt scales with categories, not rows
+        if use_tools:
+            spending_tools = get_spending_tools(uploaded_file.file_id, uploaded_file, history["rules"])
+            spending_history_text = spending_tools.overview()
+        elif incremental:
+            spending_history_text = format_incremental_history(get_account_store())
+        elif needs_map_reduce(history):
+            with st.spinner("Condensing a very large spending history..."):
+                spending_history_text = condense_upload(uploaded_file.file_id, history)
+        else:
+            spending_history_text = format_summary(history["summary"])
     except Exception as e:
         st.error(f"Could not parse the CSV file: {e}")
 else:
@@ -185,16 +248,109 @@ else:
         height=150,
         label_visibility="collapsed",
     )
+    pasted = parse_history_text(spending_history_text) if spending_history_text.strip() else None
+    if pasted is not None:
+        try:
+            with metrics.stage("detect_patterns"):
+                findings = detect_patterns(pasted)
+        except Exception as e:
+            # Patterns are an extra; the pasted text still goes to the agent as written
+            st.warning(f"Could not scan the pasted history for patterns: {e}")
+
+detected_patterns = format_patterns(findings)
+if findings:
+    with st.expander(f"🔎 Detected patterns ({len(findings)})"):
+        st.markdown("\n".join(f"{rank}. {finding['text']}" for rank, finding in enumerate(findings, start=1)))
 
 st.divider()
 
 # ── Generate Button ───────────────────────────────────────────────────────────
+parallel_sections = st.toggle(
+    "Build the tables locally and write the narrative sections in parallel (faster)", value=False
+)
+stream_output = not parallel_sections and st.toggle("Stream the report as it is generated", value=True)
+
 if st.button("Generate Budget Report", type="primary", use_container_width=True):
     if not any([income_input.strip(), expenses_input.strip(), goals_input.strip(), spending_history_text.strip()]):
         st.warning("Please fill in at least one section before generating a report.")
     else:
-        prompt = build_prompt(income_input, expenses_input, goals_input, spending_history_text)
-        with st.spinner("Analysing your finances and generating your budget report..."):
-            report = asyncio.run(generate_tasks(prompt))
-        st.success("Your Budget Health Report is ready!")
-        st.markdown(report)
+        with metrics.report():
+            with metrics.stage("build_prompt"):
+                prompt, compression = plan_prompt(
+                    income_input,
+                    expenses_input,
+                    goals_input,
+                    spending_history_text,
+                    token_budget=prompt_token_budget(task_generator.instructions),
+                    detected_patterns=detected_patterns,
+                )
+            metrics.observe("local_prompt_tokens", count_tokens(prompt))
+            if format_compression(compression):
+                st.caption("Prompt compacted to fit the token budget — " + "; ".join(format_compression(compression)))
+            queued = get_dispatcher().depth
+            if queued:
+                st.info(f"The service is busy: {queued} report(s) ahead of yours. It will start automatically.")
+            agent, fingerprint = task_generator, ""
+            if spending_tools is not None:
+                agent = task_generator.clone(tools=spending_tools.as_tools())
+                fingerprint = spending_tools.fingerprint
+            if parallel_sections:
+                # The section writers have no tools, so they get the local summary instead of the tools overview
+                section_history = spending_history_text if spending_tools is None else format_summary(history_summary)
+                key = cache_key(prompt + fingerprint + "\x00parallel-sections", agent.instructions, agent.model)
+                with st.spinner("Analysing your finances and generating your budget report..."):
+                    report = run_coroutine(
+                        get_response_cache().get_or_generate(
+                            key,
+                            lambda: generate_report(
+                                income_input,
+                                expenses_input,
+                                goals_input,
+                                section_history,
+                                summary=history_summary,
+                                token_budget=prompt_token_budget(task_generator.instructions),
+                                detected_patterns=detected_patterns,
+                            ),
+                        )
+                    )
+                st.success("Your Budget Health Report is ready!")
+                with metrics.stage("render"):
+                    st.markdown(report)
+            elif stream_output:
+                # Network and rendering overlap when streaming, so they are timed together
+                with metrics.stage("stream_and_render"):
+                    report = stream_tasks_cached(prompt, st.empty(), agent=agent, data_fingerprint=fingerprint)
+                st.success("Your Budget Health Report is ready!")
+            else:
+                with st.spinner("Analysing your finances and generating your budget report..."):
+                    report = run_coroutine(generate_tasks_cached(prompt, agent=agent, data_fingerprint=fingerprint))
+                st.success("Your Budget Health Report is ready!")
+                with metrics.stage("render"):
+                    st.markdown(report)
+        if incremental:
+            # The next incremental report starts from the rows stored after this one
+            get_account_store().record_report()
+        stats = get_response_cache().stats
+        st.caption(
+            f"Cache: {stats['memory_hits']} memory hits, {stats['disk_hits']} disk hits, "
+            f"{stats['misses']} misses — {stats['seconds_saved']:.1f}s saved"
+        )
+
+# ── Diagnostics ───────────────────────────────────────────────────────────────
+if st.sidebar.checkbox("Show diagnostics"):
+    snapshot = metrics.snapshot()
+    st.sidebar.subheader("Latency & tokens")
+    st.sidebar.dataframe(
+        [{"metric": name, **stats} for name, stats in sorted(snapshot["histograms"].items())],
+        use_container_width=True,
+    )
+    st.sidebar.subheader("Request queue")
+    st.sidebar.json(get_dispatcher().stats())
+    st.sidebar.subheader("Model latency")
+    st.sidebar.dataframe(
+        [{"route": route, **stats} for route, stats in sorted(get_router().stats().items())],
+        use_container_width=True,
+    )
+    st.sidebar.subheader("Counters")
+    st.sidebar.json(snapshot["counters"])
+    st.sidebar.caption(f"Exported to {metrics.directory}/metrics.jsonl and {metrics.directory}/metrics.prom")
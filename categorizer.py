@@ -0,0 +1,155 @@
+import re
+
+import pandas as pd
+from agents import Runner
+
+from budget_agent import BUDGET_MODEL
+from dispatcher import PRIORITY_INTERACTIVE, get_dispatcher
+from resources import get_agent, get_run_config
+
+
+# Seed rules keyed on normalised merchant text; uploaded histories add to these
+DEFAULT_RULES = {
+    "starbucks": "Coffee Shops",
+    "dunkin": "Coffee Shops",
+    "uber eats": "Dining Out",
+    "doordash": "Dining Out",
+    "grubhub": "Dining Out",
+    "uber": "Transport",
+    "lyft": "Transport",
+    "shell": "Transport",
+    "netflix": "Entertainment",
+    "spotify": "Entertainment",
+    "whole foods": "Groceries",
+    "trader joe s": "Groceries",
+    "amazon prime": "Subscriptions",
+    "amazon": "Shopping",
+    "rent": "Housing",
+}
+
+CATEGORIZER_INSTRUCTIONS = """You label bank transaction descriptions with spending categories.
+Reply with exactly one line per description, in the form `description => category`, and nothing else.
+Prefer one of the known categories when it fits; otherwise use a short, common category name."""
+
+
+def normalize_descriptions(descriptions):
+    """Lower-case merchant descriptions and collapse punctuation to single spaces (vectorised)."""
+    return (
+        pd.Series(descriptions, dtype="object")
+        .fillna("")
+        .astype(str)
+        .str.lower()
+        .str.replace(r"[^a-z0-9]+", " ", regex=True)
+        .str.strip()
+    )
+
+
+class MerchantCategorizer:
+    """Labels transactions from normalised merchant descriptions.
+
+    Exact rules (learned from the history or from the agent, one per distinct description) are
+    looked up with a vectorised dict ``map``, so their cost does not grow with the rule count.
+    Only the short seed ``keywords`` are compiled into an alternation regex (longest first, so
+    "uber eats" wins over "uber"), and it only runs on the distinct descriptions left unmatched.
+    """
+
+    def __init__(self, keywords=None, rules=None):
+        self.keywords = {}
+        self.rules = {}
+        self._pattern = None
+        self.add_keywords(DEFAULT_RULES if keywords is None else keywords)
+        self.add_rules(rules or {})
+
+    @staticmethod
+    def _normalized(rules):
+        keys = normalize_descriptions(list(rules))
+        return {key: str(category).strip() for key, category in zip(keys, rules.values()) if key and category}
+
+    def add_keywords(self, keywords):
+        """Add ``{merchant text: category}`` rules matched anywhere in a description (whole words)."""
+        self.keywords.update(self._normalized(keywords))
+        self._pattern = None
+        return self
+
+    def add_rules(self, rules):
+        """Add ``{description: category}`` rules matched against the whole normalised description."""
+        self.rules.update(self._normalized(rules))
+        return self
+
+    def categories(self):
+        return sorted(set(self.keywords.values()) | set(self.rules.values()))
+
+    @property
+    def pattern(self):
+        if self._pattern is None and self.keywords:
+            alternatives = sorted(self.keywords, key=len, reverse=True)
+            self._pattern = re.compile(r"\b(" + "|".join(re.escape(key) for key in alternatives) + r")\b")
+        return self._pattern
+
+    def learn(self, df):
+        """Seed rules from rows that already carry a Category (most frequent category per description)."""
+        if "Category" not in df:
+            return self
+        labelled = pd.DataFrame(
+            {"merchant": normalize_descriptions(df["Description"]).to_numpy(), "category": df["Category"].to_numpy()}
+        ).dropna()
+        labelled = labelled[(labelled["merchant"] != "") & (labelled["category"].astype(str).str.strip() != "")]
+        if labelled.empty:
+            return self
+        most_common = labelled.value_counts().reset_index().drop_duplicates("merchant")
+        return self.add_rules(dict(zip(most_common["merchant"], most_common["category"])))
+
+    def label(self, descriptions):
+        """Return the matched category for each description, NaN where no rule matches."""
+        normalized = normalize_descriptions(descriptions)
+        labels = normalized.map(self.rules)
+        missing = labels.isna()
+        if self.pattern is not None and missing.any():
+            # The keyword regex runs once per distinct leftover description, not once per row
+            codes, uniques = pd.factorize(normalized[missing])
+            matched = pd.Series(uniques).str.extract(self.pattern, expand=False).map(self.keywords)
+            labels[missing] = matched.to_numpy()[codes]
+        labels.index = pd.Series(descriptions).index
+        return labels
+
+    def categorize(self, df):
+        """Fill missing categories in ``df`` and return it with the descriptions that stayed unmatched."""
+        df = df.copy()
+        if "Category" not in df:
+            df["Category"] = pd.NA
+        category = df["Category"] = df["Category"].astype("object")
+        missing = category.isna() | (category.astype(str).str.strip() == "")
+        if not missing.any():
+            return df, set()
+        labels = self.label(df.loc[missing, "Description"])
+        labels.index = df.index[missing]
+        df.loc[missing, "Category"] = labels
+        unmatched = df.loc[missing & labels.reindex(df.index).isna(), "Description"].dropna().astype(str)
+        return df, set(unmatched[unmatched.str.strip() != ""])
+
+
+def get_categorizer_agent():
+    return get_agent(name="Merchant Categorizer", instructions=CATEGORIZER_INSTRUCTIONS, model=BUDGET_MODEL)
+
+
+async def categorize_with_agent(descriptions, categories=(), priority=PRIORITY_INTERACTIVE):
+    """Ask the agent to label every unmatched description in one batched request."""
+    descriptions = sorted(set(descriptions))
+    if not descriptions:
+        return {}
+    prompt = "Known categories: " + ", ".join(categories) + "\n\nDescriptions:\n"
+    prompt += "\n".join(f"- {description}" for description in descriptions)
+    agent = get_categorizer_agent()
+    result = await get_dispatcher().submit(
+        (id(agent), None, prompt), lambda: Runner.run(agent, prompt, run_config=get_run_config()), priority=priority
+    )
+
+    wanted = set(descriptions)
+    rules = {}
+    for line in str(result.final_output).splitlines():
+        if "=>" not in line:
+            continue
+        description, category = (part.strip().strip("-*` ") for part in line.split("=>", 1))
+        if description in wanted and category:
+            rules[description] = category
+    return rules
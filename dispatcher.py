@@ -0,0 +1,280 @@
+import asyncio
+import heapq
+import itertools
+import os
+import threading
+import time
+from contextlib import asynccontextmanager
+
+from metrics import metrics
+
+
+# Lower runs first: people waiting on a report in the app go ahead of offline batch work
+PRIORITY_INTERACTIVE = 0
+PRIORITY_BATCH = 10
+
+
+class TokenBucket:
+    """Allows ``rate`` requests per second on average, with bursts of up to ``capacity``."""
+
+    def __init__(self, rate, capacity):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    async def acquire(self):
+        """Take one token, sleeping until the bucket has refilled enough to provide it."""
+        if not self.rate:
+            return
+        while True:
+            self._refill()
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return
+            await asyncio.sleep((1 - self.tokens) / self.rate)
+
+    def try_acquire(self):
+        """Take one token if one is available right now, without waiting."""
+        if not self.rate:
+            return True
+        self._refill()
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return True
+        return False
+
+    def wait_time(self):
+        """Seconds until the next token is available (0.0 when one is available now)."""
+        if not self.rate:
+            return 0.0
+        self._refill()
+        return max(0.0, (1 - self.tokens) / self.rate)
+
+
+class _Broadcast:
+    """Items of one in-flight stream, replayed from the start to every subscriber."""
+
+    def __init__(self):
+        self.items = []
+        self.done = False
+        self.error = None
+        self._changed = asyncio.Event()
+
+    def _signal(self):
+        self._changed.set()
+        self._changed = asyncio.Event()
+
+    def push(self, item):
+        self.items.append(item)
+        self._signal()
+
+    def finish(self, error=None):
+        self.done = True
+        self.error = error
+        self._signal()
+
+    async def subscribe(self):
+        index = 0
+        while True:
+            while index < len(self.items):
+                yield self.items[index]
+                index += 1
+            if self.done:
+                if self.error is not None:
+                    raise self.error
+                return
+            await self._changed.wait()
+
+
+class Dispatcher:
+    """Process-wide gate in front of the model provider, shared by every session and batch job.
+
+    Identical requests already in flight are coalesced onto one call (single flight); the rest
+    wait in a priority queue for one of ``max_in_flight`` slots and a token from the rate
+    limiter. Both are granted together to the head of the queue, so nobody holds a slot while
+    sleeping on the rate limiter, and interactive requests get the next token ahead of batch
+    work that queued earlier. When ``max_queue`` requests are already waiting, new ones wait for room instead of
+    failing, so a burst slows reports down rather than tripping the provider's rate limits.
+    """
+
+    def __init__(self, max_in_flight=20, max_queue=200, requests_per_minute=60, burst=10):
+        self.max_in_flight = max_in_flight
+        self.max_queue = max_queue
+        self.bucket = TokenBucket(requests_per_minute / 60, burst)
+        self.in_flight = 0
+        self.coalesced = 0
+        self._queue = []  # heap of (priority, seq, future)
+        self._seq = itertools.count()
+        self._room = None
+        self._pump_task = None
+        self._calls = {}
+        self._streams = {}
+
+    @property
+    def depth(self):
+        return len(self._queue)
+
+    def stats(self):
+        """Current queue depth, running requests and coalesced duplicates, e.g. for the diagnostics panel."""
+        return {
+            "queue_depth": self.depth,
+            "in_flight": self.in_flight,
+            "max_in_flight": self.max_in_flight,
+            "coalesced": self.coalesced,
+        }
+
+    async def _acquire(self, priority):
+        """Take a slot and a rate-limit token, queueing by ``priority`` until both are available."""
+        if self.try_acquire():
+            return
+        if self._room is None:
+            self._room = asyncio.Condition()
+        async with self._room:
+            # Back-pressure: hold new arrivals outside a full queue instead of rejecting them
+            await self._room.wait_for(lambda: len(self._queue) < self.max_queue)
+        # The queue may have drained while we waited; nobody would grant a slot to us then
+        if self.try_acquire():
+            return
+        waiter = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._queue, (priority, next(self._seq), waiter))
+        metrics.observe("dispatch_queue_depth", len(self._queue))
+        self._wake()
+        try:
+            await waiter
+        except asyncio.CancelledError:
+            if waiter.done() and not waiter.cancelled():
+                self.release()  # the slot was granted just as we were cancelled
+            else:
+                self._queue = [entry for entry in self._queue if entry[2] is not waiter]
+                heapq.heapify(self._queue)
+                self._notify()
+            raise
+
+    def _wake(self):
+        if self._pump_task is None or self._pump_task.done():
+            self._pump_task = asyncio.ensure_future(self._pump())
+
+    async def _pump(self):
+        """Grant slots to the head of the queue, each together with a rate-limit token."""
+        while self._queue and self.in_flight < self.max_in_flight:
+            if self._queue[0][2].done():
+                heapq.heappop(self._queue)  # cancelled; its own handler is about to remove it too
+                continue
+            if not self.bucket.try_acquire():
+                # Sleep without a slot held; a higher-priority arrival meanwhile becomes the new head
+                await asyncio.sleep(self.bucket.wait_time())
+                continue
+            _, _, waiter = heapq.heappop(self._queue)
+            self.in_flight += 1
+            waiter.set_result(None)
+            self._notify()
+
+    def try_acquire(self):
+        """Take a free slot and a rate-limit token without queueing, e.g. for a speculative hedge.
+
+        Returns False, taking neither, when the queue is busy, every slot is taken or the bucket
+        is empty. A True result must be paired with :meth:`release`.
+        """
+        if self._queue or self.in_flight >= self.max_in_flight or not self.bucket.try_acquire():
+            return False
+        self.in_flight += 1
+        return True
+
+    def release(self):
+        """Give a slot back; the next queued request gets it once a rate-limit token is available."""
+        self.in_flight -= 1
+        if self._queue:
+            self._wake()
+
+    def _notify(self):
+        if self._room is not None:
+            asyncio.ensure_future(self._notify_room())
+
+    async def _notify_room(self):
+        async with self._room:
+            self._room.notify_all()
+
+    @asynccontextmanager
+    async def slot(self, priority=PRIORITY_INTERACTIVE):
+        """Hold one in-flight slot (after queueing and rate limiting) for the duration of the block."""
+        started = time.perf_counter()
+        await self._acquire(priority)
+        try:
+            metrics.observe("dispatch_wait_seconds", time.perf_counter() - started)
+            yield
+        finally:
+            self.release()
+
+    async def _run(self, make_call, priority):
+        async with self.slot(priority):
+            return await make_call()
+
+    async def submit(self, key, make_call, priority=PRIORITY_INTERACTIVE):
+        """Await ``make_call()`` through the queue, sharing the result with identical requests in flight.
+
+        The call runs as its own task, so a caller that gives up does not cancel it for the others.
+        """
+        task = self._calls.get(key)
+        if task is None:
+            task = asyncio.ensure_future(self._run(make_call, priority))
+            self._calls[key] = task
+            task.add_done_callback(lambda _: self._calls.pop(key, None))
+        else:
+            self.coalesced += 1
+            metrics.count("dispatch_coalesced")
+        return await asyncio.shield(task)
+
+    async def stream(self, key, make_stream, priority=PRIORITY_INTERACTIVE):
+        """Iterate ``make_stream()`` through the queue, fanning its items out to identical streams in flight.
+
+        The stream runs as its own task holding one slot; a request that joins late first gets
+        the items already produced. As with :meth:`submit`, a subscriber that stops reading does
+        not cancel the stream for the others.
+        """
+        broadcast = self._streams.get(key)
+        if broadcast is None:
+            broadcast = self._streams[key] = _Broadcast()
+            asyncio.ensure_future(self._produce(key, make_stream, priority, broadcast))
+        else:
+            self.coalesced += 1
+            metrics.count("dispatch_coalesced")
+        async for item in broadcast.subscribe():
+            yield item
+
+    async def _produce(self, key, make_stream, priority, broadcast):
+        try:
+            async with self.slot(priority):
+                async for item in make_stream():
+                    broadcast.push(item)
+        except BaseException as exc:
+            broadcast.finish(exc)
+            if not isinstance(exc, Exception):
+                raise
+        else:
+            broadcast.finish()
+        finally:
+            self._streams.pop(key, None)
+
+
+_lock = threading.Lock()
+_dispatcher = None
+
+
+def get_dispatcher():
+    """Return the process-wide dispatcher, sized from the OPENROUTER_* environment variables."""
+    global _dispatcher
+    with _lock:
+        if _dispatcher is None:
+            _dispatcher = Dispatcher(
+                max_in_flight=int(os.environ.get("OPENROUTER_MAX_CONNECTIONS", 20)),
+                max_queue=int(os.environ.get("OPENROUTER_MAX_QUEUE", 200)),
+                requests_per_minute=float(os.environ.get("OPENROUTER_REQUESTS_PER_MINUTE", 60)),
+                burst=int(os.environ.get("OPENROUTER_BURST", 10)),
+            )
+        return _dispatcher
@@ -0,0 +1,160 @@
+import asyncio
+
+import pandas as pd
+from agents import Runner
+
+from analytics import SPENDING_COLUMNS, SpendingAggregator, format_summary
+from budget_agent import BUDGET_MODEL
+from categorizer import MerchantCategorizer, categorize_with_agent
+from dispatcher import PRIORITY_BATCH, PRIORITY_INTERACTIVE, get_dispatcher
+from metrics import metrics
+from patterns import PatternAccumulator
+from resources import get_agent, get_run_config, run_coroutine
+
+
+CHUNK_SIZE = 50_000
+PREVIEW_PAGE_SIZE = 50
+# Above this size the local summary is itself too long to paste, so chunks are condensed by the agent
+MAX_SUMMARY_CHARS = 12_000
+# Cap on distinct unmatched descriptions collected for the batched categorisation request
+MAX_UNMATCHED = 500
+
+SUMMARIZER_INSTRUCTIONS = """You condense aggregated spending figures for a budget analyst.
+You will receive a summary of one slice of a user's transaction history (totals, counts and means per category and period).
+Restate it as a compact bullet list that keeps every category, the largest totals and any notable period-over-period changes.
+Never invent figures, round away differences, or give financial advice."""
+
+
+def read_csv_chunks(source, chunksize=CHUNK_SIZE):
+    """Iterate over a spending-history CSV in fixed-size DataFrame chunks."""
+    if hasattr(source, "seek"):
+        source.seek(0)
+    return pd.read_csv(source, chunksize=chunksize)
+
+
+def ingest_csv(source, chunksize=CHUNK_SIZE, freq="M", categorizer=None, store=None, patterns=None):
+    """Fold a CSV into running aggregates chunk by chunk, keeping memory constant in the row count.
+
+    Returns a dict with the raw row count, the overall summary and one local summary text per
+    chunk (used for map-reduce summarisation when the overall summary is too long for the prompt).
+    With a ``categorizer``, rows without a Category are labelled locally and the descriptions
+    it could not match are returned under ``"unmatched"``. With a ``store``, each chunk is also
+    added to the persistent transaction store and ``"new_rows"`` counts the rows it had not seen.
+    With a :class:`~patterns.PatternAccumulator`, each categorised chunk is folded into it and
+    the ranked pattern findings are returned under ``"findings"``.
+    """
+    aggregator = SpendingAggregator(freq)
+    chunk_summaries = []
+    unmatched = set()
+    rows = 0
+    new_rows = 0
+    occurrences = {}
+    for chunk in read_csv_chunks(source, chunksize):
+        rows += len(chunk)
+        if categorizer is not None:
+            chunk, chunk_unmatched = categorizer.learn(chunk).categorize(chunk)
+            unmatched.update(list(chunk_unmatched)[: MAX_UNMATCHED - len(unmatched)])
+        if store is not None:
+            new_rows += store.add(chunk, occurrences)
+        if patterns is not None:
+            patterns.update(chunk)
+        chunk_aggregator = SpendingAggregator(freq).update(chunk)
+        chunk_summaries.append(format_summary(chunk_aggregator.summary()))
+        aggregator.merge(chunk_aggregator)
+    return {
+        "rows": rows,
+        "summary": aggregator.summary(),
+        "chunk_summaries": chunk_summaries,
+        "unmatched": sorted(unmatched),
+        "new_rows": new_rows,
+        "findings": patterns.findings() if patterns is not None else [],
+    }
+
+
+def ingest_with_categories(source, chunksize=CHUNK_SIZE, freq="M", store=None, priority=PRIORITY_INTERACTIVE):
+    """Ingest a CSV, labelling uncategorised rows locally and sending only the leftovers to the agent.
+
+    The first local pass also writes to ``store``. Unmatched descriptions then go out in one
+    batched request; only if the agent labelled any is the file read a second time, to rebuild
+    the summary and pattern findings with the new rules, while the stored rows are relabelled
+    in place. If the agent request fails, the local labels stand, the leftovers stay
+    Uncategorised and the reason is returned under ``"warnings"``. The final rule set is
+    returned under ``"rules"`` so later reads of the same file can label rows identically.
+    """
+    categorizer = MerchantCategorizer()
+    history = ingest_csv(source, chunksize, freq, categorizer=categorizer, store=store, patterns=PatternAccumulator())
+    rules = {}
+    warnings = []
+    if history["unmatched"]:
+        try:
+            rules = run_coroutine(
+                categorize_with_agent(history["unmatched"], categorizer.categories(), priority=priority)
+            )
+        except Exception as exc:
+            metrics.count("categorize_errors")
+            warnings.append(
+                f"Could not label {len(history['unmatched'])} merchant descriptions with the agent ({exc}); "
+                "they are reported as Uncategorised."
+            )
+        categorizer.add_rules(rules)
+    if rules:
+        new_rows = history["new_rows"]
+        history = ingest_csv(source, chunksize, freq, categorizer=categorizer, patterns=PatternAccumulator())
+        history["new_rows"] = new_rows
+        if store is not None:
+            store.relabel(categorizer.label)
+    history["rules"] = dict(categorizer.rules)
+    history["warnings"] = warnings
+    return history
+
+
+def load_transactions(source, chunksize=CHUNK_SIZE, categorizer=None):
+    """Load the four spending columns into one frame (chunked read, categories labelled locally)."""
+    chunks = []
+    for chunk in read_csv_chunks(source, chunksize):
+        if categorizer is not None:
+            chunk = categorizer.learn(chunk).categorize(chunk)[0]
+        chunks.append(chunk.reindex(columns=SPENDING_COLUMNS))
+    return pd.concat(chunks, ignore_index=True) if chunks else pd.DataFrame(columns=SPENDING_COLUMNS)
+
+
+def read_page(source, page, page_size=PREVIEW_PAGE_SIZE):
+    """Read one zero-based page of rows for the UI preview without loading the whole file."""
+    if hasattr(source, "seek"):
+        source.seek(0)
+    return pd.read_csv(source, skiprows=range(1, page * page_size + 1), nrows=page_size)
+
+
+def needs_map_reduce(history, max_chars=MAX_SUMMARY_CHARS):
+    """True when the local summary alone would still be too long for the report prompt."""
+    return len(history["chunk_summaries"]) > 1 and len(format_summary(history["summary"])) > max_chars
+
+
+def get_summarizer_agent():
+    return get_agent(name="History Summarizer", instructions=SUMMARIZER_INSTRUCTIONS, model=BUDGET_MODEL)
+
+
+async def map_reduce_history(history, max_in_flight=8):
+    """Condense each chunk summary with a concurrent agent call and reduce them into one prompt section."""
+    agent = get_summarizer_agent()
+    semaphore = asyncio.Semaphore(max_in_flight)
+    total = len(history["chunk_summaries"])
+
+    async def condense(index, text):
+        prompt = f"Slice {index} of {total}:\n{text}"
+        async with semaphore:
+            result = await get_dispatcher().submit(
+                (id(agent), None, prompt),
+                lambda: Runner.run(agent, prompt, run_config=get_run_config()),
+                priority=PRIORITY_BATCH,
+            )
+            return result.final_output
+
+    parts = await asyncio.gather(
+        *(condense(index, text) for index, text in enumerate(history["chunk_summaries"], start=1))
+    )
+
+    headline = format_summary(history["summary"]).split("\n", 1)[0]
+    sections = [f"Overall: {headline}"]
+    sections += [f"### Slice {index} of {total}\n{part.strip()}" for index, part in enumerate(parts, start=1)]
+    return "\n\n".join(sections)
@@ -1,34 +1,27 @@
 import os
-import asyncio
-from openai import AsyncOpenAI
-from agents import Agent, Runner, RunConfig
-from agents.models.openai_provider import OpenAIProvider
+import sys
+import argparse
+from agents import Runner
 
 from dotenv import load_dotenv
 load_dotenv(override=True)
 
-# Définissez votre clé API OpenRouter ici. Remplacez "VOTRE_CLE_API_OPENROUTER_ICI" par votre clé réelle.
-os.environ["OPENROUTER_API_KEY"] = "MY_OPENROUTER_API_KEY"
-# Définissez également l'URL de base pour OpenRouter afin que la bibliothèque agents la prenne en compte.
-os.environ["OPENROUTER_API_BASE"] = "https://openrouter.ai/api/v1"
+from batch import run_batch
+from resources import get_agent, get_run_config, run_coroutine
+from streaming import stream_text
+
+# The API key comes from the environment or .env (loaded above), as in budget_manager_app.py
+os.environ.setdefault("OPENROUTER_API_BASE", "https://openrouter.ai/api/v1")
 
 # 1. Check for the OpenRouter API key
 if "OPENROUTER_API_KEY" not in os.environ:
     raise ValueError("OPENROUTER_API_KEY environment variable not set.")
 
-# 2. Create a custom AsyncOpenAI client for OpenRouter
-openrouter_client = AsyncOpenAI(
-    base_url=os.environ["OPENROUTER_API_BASE"],
-    api_key=os.environ["OPENROUTER_API_KEY"],
-    
-)
-
-# 3. Wrap the client in an OpenAIProvider
-openrouter_provider = OpenAIProvider(openai_client=openrouter_client)
+# 2. The shared OpenRouter client/provider (resources.py) picks up OPENROUTER_API_BASE
 
 
 # Define the Task Generator agent
-task_generator = Agent(
+task_generator = get_agent(
     name="Task Generator",
     instructions="""You help users break down their specific LLM powered AI Agent goal into small, achievable tasks.
     For any goal, analyze it and create a structured plan with specific actionable steps.
@@ -42,23 +35,72 @@ task_generator = Agent(
 
 # Define a function to run the agent with the correct provider
 async def generate_tasks(goal):
-    # 4. Pass the provider to the runner via RunConfig
+    # 4. Pass the shared provider to the runner via RunConfig
     result = await Runner.run(
         task_generator, 
         goal, 
-        run_config=RunConfig(model_provider=openrouter_provider)
+        run_config=get_run_config()
     )
     return result.final_output
 
 
+# Print the plan token by token as the model produces it
+async def stream_tasks(goal):
+    chunks = []
+    async for delta in stream_text(
+        task_generator,
+        goal,
+        run_config=get_run_config(),
+    ):
+        chunks.append(delta)
+        sys.stdout.write(delta)
+        sys.stdout.flush()
+    print()
+    return "".join(chunks)
+
+
 # Example usage
-async def main():
-    user_goal = "Start a small online business selling handmade jewelry"
-    tasks = await generate_tasks(user_goal)
+async def main(goal, stream=False):
     print("--- Generated Task Plan ---")
-    print(tasks)
+    if stream:
+        await stream_tasks(goal)
+    else:
+        tasks = await generate_tasks(goal)
+        print(tasks)
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Generate a task plan with the Task Generator agent.")
+    parser.add_argument(
+        "goal",
+        nargs="?",
+        default="Start a small online business selling handmade jewelry",
+        help="Goal to break down into tasks.",
+    )
+    parser.add_argument("--stream", action="store_true", help="Print the plan incrementally as it is generated.")
+    parser.add_argument(
+        "--batch",
+        metavar="INPUT_DIR",
+        help="Generate a Budget Health Report for every spending-history CSV in INPUT_DIR instead.",
+    )
+    parser.add_argument("--output-dir", default="reports", help="Where batch reports are written (default: reports).")
+    parser.add_argument("--max-in-flight", type=int, default=8, help="Maximum concurrent agent requests in batch mode.")
+    parser.add_argument("--retries", type=int, default=5, help="Retries per file on 429/5xx responses in batch mode.")
+    return parser.parse_args(argv)
+
+
+async def main_batch(input_dir, output_dir, max_in_flight, retries):
+    counts = await run_batch(input_dir, output_dir, max_in_flight=max_in_flight, retries=retries)
+    print(f"--- Batch complete: {counts['done']} done, {counts['failed']} failed, {counts['skipped']} already done ---")
+
 
 # 3. Output the agent's answer
 if __name__ == "__main__":
-    asyncio.run(main())
+    args = parse_args()
+    if args.batch:
+        # Size the shared connection pool to the concurrency limit before the client is built
+        os.environ.setdefault("OPENROUTER_MAX_CONNECTIONS", str(max(args.max_in_flight, 20)))
+        run_coroutine(main_batch(args.batch, args.output_dir, args.max_in_flight, args.retries))
+    else:
+        run_coroutine(main(args.goal, stream=args.stream))
 
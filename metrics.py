@@ -0,0 +1,139 @@
+import json
+import math
+import os
+import re
+import threading
+import time
+from collections import defaultdict, deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+
+# The report currently being traced; stages, tokens and counters recorded while it is set
+# are attached to it as well as to the process-wide histograms.
+current_trace = ContextVar("current_trace", default=None)
+
+QUANTILES = (0.5, 0.95, 0.99)
+
+
+class RollingHistogram:
+    """Keeps the last ``window`` observations and reports nearest-rank percentiles over them."""
+
+    def __init__(self, window=1000):
+        self._values = deque(maxlen=window)
+        self.count = 0
+
+    def observe(self, value):
+        self._values.append(value)
+        self.count += 1
+
+    def percentiles(self, quantiles=QUANTILES):
+        values = sorted(self._values)
+        if not values:
+            return {}
+        return {q: values[min(len(values) - 1, max(0, math.ceil(q * len(values)) - 1))] for q in quantiles}
+
+
+class Metrics:
+    """Per-stage latency, token and counter metrics with JSON-lines and Prometheus-text export."""
+
+    def __init__(self, directory=".cache", window=1000):
+        self.directory = directory
+        self.window = window
+        self.histograms = defaultdict(lambda: RollingHistogram(self.window))
+        self.counters = defaultdict(int)
+        self._lock = threading.RLock()
+
+    def count(self, name, n=1):
+        """Increment a counter (retries, cache outcomes, ...)."""
+        with self._lock:
+            self.counters[name] += n
+        trace = current_trace.get()
+        if trace is not None:
+            trace["counters"][name] = trace["counters"].get(name, 0) + n
+
+    def observe(self, name, value):
+        """Record one observation in the rolling histogram ``name``."""
+        with self._lock:
+            self.histograms[name].observe(value)
+        trace = current_trace.get()
+        if trace is not None:
+            trace["values"][name] = trace["values"].get(name, 0) + value
+
+    @contextmanager
+    def stage(self, name):
+        """Time a block and record it as ``<name>_seconds``."""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(f"{name}_seconds", time.perf_counter() - started)
+
+    def record_usage(self, usage):
+        """Record prompt/completion token counts from an agents SDK ``Usage`` object."""
+        if usage is None:
+            return
+        self.observe("prompt_tokens", getattr(usage, "input_tokens", 0) or 0)
+        self.observe("completion_tokens", getattr(usage, "output_tokens", 0) or 0)
+
+    @contextmanager
+    def report(self, kind="report"):
+        """Trace one report end to end and export it when the block exits."""
+        trace = {"kind": kind, "started": time.time(), "values": {}, "counters": {}}
+        token = current_trace.set(trace)
+        started = time.perf_counter()
+        try:
+            yield trace
+        except Exception as exc:
+            trace["error"] = repr(exc)
+            raise
+        finally:
+            current_trace.reset(token)
+            elapsed = time.perf_counter() - started
+            self.observe("report_seconds", elapsed)
+            trace["values"]["report_seconds"] = elapsed
+            self.export(trace)
+
+    def snapshot(self):
+        """Current percentiles and counters, e.g. for the diagnostics panel."""
+        with self._lock:
+            histograms = {
+                name: {"count": histogram.count, **{f"p{int(q * 100)}": v for q, v in histogram.percentiles().items()}}
+                for name, histogram in self.histograms.items()
+            }
+            return {"histograms": histograms, "counters": dict(self.counters)}
+
+    def to_prometheus(self):
+        """Render the snapshot in the Prometheus text exposition format."""
+        snapshot = self.snapshot()
+        lines = []
+        for name, stats in sorted(snapshot["histograms"].items()):
+            metric = "budget_" + re.sub(r"[^a-zA-Z0-9_]", "_", name)
+            lines.append(f"# TYPE {metric} summary")
+            for q in QUANTILES:
+                key = f"p{int(q * 100)}"
+                if key in stats:
+                    lines.append(f'{metric}{{quantile="{q}"}} {stats[key]}')
+            lines.append(f"{metric}_count {stats['count']}")
+        for name, value in sorted(snapshot["counters"].items()):
+            metric = "budget_" + re.sub(r"[^a-zA-Z0-9_]", "_", name) + "_total"
+            lines.append(f"# TYPE {metric} counter")
+            lines.append(f"{metric} {value}")
+        return "\n".join(lines) + "\n"
+
+    def export(self, trace):
+        """Append the trace to metrics.jsonl and rewrite metrics.prom."""
+        if not self.directory:
+            return
+        os.makedirs(self.directory, exist_ok=True)
+        prom_path = os.path.join(self.directory, "metrics.prom")
+        with self._lock:
+            with open(os.path.join(self.directory, "metrics.jsonl"), "a", encoding="utf-8") as f:
+                f.write(json.dumps(trace) + "\n")
+            with open(prom_path + ".tmp", "w", encoding="utf-8") as f:
+                f.write(self.to_prometheus())
+            os.replace(prom_path + ".tmp", prom_path)
+
+
+# Process-wide instance shared by the apps, batch mode and the agent wrappers
+metrics = Metrics()
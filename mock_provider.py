@@ -0,0 +1,184 @@
+import asyncio
+import itertools
+import random
+
+from agents import Model, ModelProvider, ModelResponse, Usage
+from openai.types.responses import (
+    Response,
+    ResponseCompletedEvent,
+    ResponseCreatedEvent,
+    ResponseOutputMessage,
+    ResponseOutputText,
+    ResponseTextDeltaEvent,
+    ResponseUsage,
+)
+from openai.types.responses.response_usage import InputTokensDetails, OutputTokensDetails
+
+
+REPORT_SECTIONS = [
+    "## Budget Overview",
+    "## Spending Analysis",
+    "## Key Insights & Recommendations",
+    "## Goal Progress",
+]
+
+
+def estimate_tokens(text):
+    """Rough token count (about four characters per token)."""
+    return max(1, len(text) // 4)
+
+
+def _input_text(input):
+    if isinstance(input, str):
+        return input
+    return " ".join(str(item.get("content", "")) if isinstance(item, dict) else str(item) for item in input or [])
+
+
+class MockModel(Model):
+    """Offline stand-in model with configurable time-to-first-token, throughput and output size.
+
+    ``slow_fraction`` of requests take ``slow_factor`` times longer to start (a latency tail),
+    and a model built with ``fail=True`` raises ``ConnectionError`` instead of answering.
+    """
+
+    def __init__(
+        self,
+        name,
+        latency=0.5,
+        tokens_per_second=80.0,
+        output_tokens=600,
+        slow_fraction=0.0,
+        slow_factor=10.0,
+        fail=False,
+        rng=None,
+    ):
+        self.name = name
+        self.latency = latency
+        self.tokens_per_second = tokens_per_second
+        self.output_tokens = output_tokens
+        self.slow_fraction = slow_fraction
+        self.slow_factor = slow_factor
+        self.fail = fail
+        self._rng = rng or random.Random(0)
+        self._ids = itertools.count(1)
+
+    async def _wait_for_first_token(self):
+        latency = self.latency
+        if self._rng.random() < self.slow_fraction:
+            latency *= self.slow_factor
+        await asyncio.sleep(latency)
+        if self.fail:
+            raise ConnectionError(f"mock model {self.name} is unavailable")
+
+    def _tokens(self):
+        """The report body as a list of ~one-token words, split across the four report sections."""
+        words = []
+        per_section = max(1, self.output_tokens // len(REPORT_SECTIONS))
+        for section in REPORT_SECTIONS:
+            words.append(f"\n\n{section}\n")
+            words.extend("lorem " for _ in range(per_section - 1))
+        return words
+
+    def _message(self, text, item_id):
+        content = ResponseOutputText.model_construct(type="output_text", text=text, annotations=[])
+        return ResponseOutputMessage.model_construct(
+            id=item_id, type="message", role="assistant", status="completed", content=[content]
+        )
+
+    def _usage(self, input, tokens):
+        return estimate_tokens(_input_text(input)), len(tokens)
+
+    async def get_response(self, system_instructions, input, *args, **kwargs):
+        tokens = self._tokens()
+        await self._wait_for_first_token()
+        await asyncio.sleep(len(tokens) / self.tokens_per_second)
+        text = "".join(tokens).strip()
+        input_tokens, output_tokens = self._usage(input, tokens)
+        return ModelResponse(
+            output=[self._message(text, f"msg_mock_{next(self._ids)}")],
+            usage=Usage(
+                requests=1,
+                input_tokens=input_tokens,
+                output_tokens=output_tokens,
+                total_tokens=input_tokens + output_tokens,
+            ),
+            response_id=None,
+        )
+
+    async def stream_response(self, system_instructions, input, *args, **kwargs):
+        item_id = f"msg_mock_{next(self._ids)}"
+        response = Response.model_construct(id=f"resp_{item_id}", model=self.name, object="response", output=[])
+        yield ResponseCreatedEvent.model_construct(type="response.created", response=response, sequence_number=0)
+
+        await self._wait_for_first_token()
+        tokens = self._tokens()
+        for sequence, token in enumerate(tokens, start=1):
+            await asyncio.sleep(1 / self.tokens_per_second)
+            yield ResponseTextDeltaEvent.model_construct(
+                type="response.output_text.delta",
+                item_id=item_id,
+                output_index=0,
+                content_index=0,
+                delta=token,
+                sequence_number=sequence,
+            )
+
+        text = "".join(tokens)
+        input_tokens, output_tokens = self._usage(input, tokens)
+        response = Response.model_construct(
+            id=f"resp_{item_id}",
+            model=self.name,
+            object="response",
+            output=[self._message(text, item_id)],
+            usage=ResponseUsage.model_construct(
+                input_tokens=input_tokens,
+                output_tokens=output_tokens,
+                total_tokens=input_tokens + output_tokens,
+                input_tokens_details=InputTokensDetails.model_construct(cached_tokens=0),
+                output_tokens_details=OutputTokensDetails.model_construct(reasoning_tokens=0),
+            ),
+        )
+        yield ResponseCompletedEvent.model_construct(
+            type="response.completed", response=response, sequence_number=len(tokens) + 1
+        )
+
+
+class MockModelProvider(ModelProvider):
+    """Model provider for ``RunConfig(model_provider=...)`` that never touches the network.
+
+    ``model_latency`` overrides the latency per model name, ``slow_fractions`` injects a latency
+    tail per model name and ``failing_models`` always error, e.g. to exercise routing and fallback.
+    """
+
+    def __init__(
+        self,
+        latency=0.5,
+        tokens_per_second=80.0,
+        output_tokens=600,
+        model_latency=None,
+        slow_fractions=None,
+        slow_factor=10.0,
+        failing_models=(),
+        seed=0,
+    ):
+        self.latency = latency
+        self.tokens_per_second = tokens_per_second
+        self.output_tokens = output_tokens
+        self.model_latency = model_latency or {}
+        self.slow_fractions = slow_fractions or {}
+        self.slow_factor = slow_factor
+        self.failing_models = set(failing_models)
+        self._rng = random.Random(seed)
+
+    def get_model(self, model_name):
+        name = model_name or "mock"
+        return MockModel(
+            name,
+            latency=self.model_latency.get(name, self.latency),
+            tokens_per_second=self.tokens_per_second,
+            output_tokens=self.output_tokens,
+            slow_fraction=self.slow_fractions.get(name, 0.0),
+            slow_factor=self.slow_factor,
+            fail=name in self.failing_models,
+            rng=self._rng,
+        )
@@ -0,0 +1,272 @@
+import numpy as np
+import pandas as pd
+
+from analytics import prepare_transactions
+
+
+# Weekly category spikes: z-score of a week's total against the trailing SPIKE_WINDOW weeks
+SPIKE_WINDOW = 8
+SPIKE_Z = 2.5
+RECENT_WEEKS = 4
+
+# Month-over-month changes: the last MOM_DAYS against the average of the preceding windows
+MOM_DAYS = 30
+MOM_BASELINE_WINDOWS = 3
+MOM_MIN_CHANGE = 0.25
+
+# Recurring charges: same merchant and amount at a steady cadence (label, min gap, max gap, per year)
+CADENCES = [
+    ("weekly", 6, 8, 52),
+    ("fortnightly", 13, 16, 26),
+    ("monthly", 27, 33, 12),
+    ("quarterly", 85, 97, 4),
+    ("yearly", 355, 375, 1),
+]
+MIN_OCCURRENCES = 3
+MAX_GAP_SPREAD = 0.2
+
+# Spikes and changes smaller than this (in dollars) are left out; recurring charges are always kept
+MIN_IMPACT = 20.0
+MAX_FINDINGS = 8
+
+PATTERNS_GUIDANCE = (
+    "Computed locally from the full history and ranked by dollar impact; "
+    "base the Key Insights on these findings rather than recomputing them."
+)
+
+
+def daily_totals(df):
+    """Day x Category spend with every calendar day present, built with one bincount over integer codes."""
+    days = df["Date"].to_numpy(dtype="datetime64[D]").astype(np.int64)
+    categories, names = pd.factorize(df["Category"], sort=True)
+    first = days.min()
+    span = int(days.max() - first) + 1
+    totals = np.bincount(
+        (days - first) * len(names) + categories,
+        weights=df["Amount"].to_numpy(dtype=float),
+        minlength=span * len(names),
+    )
+    index = pd.date_range(pd.Timestamp(first, unit="D"), periods=span, freq="D")
+    return pd.DataFrame(totals.reshape(span, len(names)), index=index, columns=names)
+
+
+def _daily_frame(totals):
+    """Day x Category frame (every calendar day present) from a ``(day, category) -> amount`` Series."""
+    daily = totals.unstack(fill_value=0.0).sort_index(axis=1)
+    return daily.reindex(pd.date_range(daily.index.min(), daily.index.max(), freq="D"), fill_value=0.0)
+
+
+def category_spikes(daily, window=SPIKE_WINDOW, threshold=SPIKE_Z, recent=RECENT_WEEKS):
+    """Weeks in the last ``recent`` whose category total sits ``threshold`` deviations above its trailing mean."""
+    weekly = daily.groupby(daily.index.to_period("W")).sum()
+    if len(weekly) <= window // 2:
+        return []
+
+    # Each week is compared with the weeks before it, never with itself
+    baseline = weekly.shift(1).rolling(window, min_periods=window // 2)
+    mean, std = baseline.mean(), baseline.std()
+    z = (weekly - mean) / std.where(std > 0)
+    excess = weekly - mean
+
+    hits = z.iloc[-recent:].stack()
+    hits = hits[hits >= threshold]
+    findings = []
+    for (week, category), score in hits.items():
+        impact = float(excess.at[week, category])
+        if impact < MIN_IMPACT:
+            continue
+        findings.append(
+            {
+                "kind": "spike",
+                "subject": category,
+                "impact": impact,
+                "text": (
+                    f"Spike: {category} spending in the week of {week.start_time:%Y-%m-%d} was "
+                    f"${weekly.at[week, category]:,.2f} vs. ${mean.at[week, category]:,.2f} typical "
+                    f"(z = {score:.1f})"
+                ),
+            }
+        )
+    return findings
+
+
+def _series_codes(merchants, cents):
+    """One integer code per (merchant, amount in cents) series."""
+    return pd.factorize(merchants.astype(np.int64) * (int(np.abs(cents).max()) * 2 + 1) + cents)[0]
+
+
+def _recurring(codes, days, describe):
+    """Recurring-charge findings from per-transaction series ``codes`` and ``days``.
+
+    ``describe(i)`` returns ``(merchant, category, amount)`` for the transaction at position ``i``.
+    """
+    history_end = days.max()
+
+    # Only series seen often enough can be recurring; this drops most one-off purchases up front
+    rows = np.flatnonzero(np.bincount(codes)[codes] >= MIN_OCCURRENCES)
+    if not len(rows):
+        return []
+
+    # Sort once by (series, date); gaps between consecutive charges of the same series in one pass
+    order = rows[np.lexsort((days[rows], codes[rows]))]
+    codes, days = codes[order], days[order]
+    same = codes[1:] == codes[:-1]
+    first = pd.Series(order[np.r_[True, ~same]], index=codes[np.r_[True, ~same]])
+    last_day = pd.Series(days[np.r_[~same, True]], index=codes[np.r_[~same, True]])
+    stats = pd.Series(np.diff(days)[same]).groupby(codes[1:][same]).agg(["median", "std", "size"])
+    stats = stats[(stats["median"] > 0) & (stats["std"] <= MAX_GAP_SPREAD * stats["median"])]
+
+    findings = []
+    for code, row in stats.iterrows():
+        cadence = next((c for c in CADENCES if c[1] <= row["median"] <= c[2]), None)
+        # Skip series with no charge for more than one and a half cycles: probably cancelled
+        if cadence is None or history_end - last_day[code] > 1.5 * row["median"]:
+            continue
+        label, _, _, per_year = cadence
+        merchant, category, amount = describe(first[code])
+        monthly = float(amount) * per_year / 12
+        findings.append(
+            {
+                "kind": "recurring",
+                "subject": merchant,
+                "impact": monthly,
+                "text": (
+                    f"Recurring: {merchant} ({category}) ${amount:,.2f} {label}, "
+                    f"{int(row['size']) + 1} charges, about ${monthly * 12:,.2f}/year"
+                ),
+            }
+        )
+    return findings
+
+
+def recurring_charges(df):
+    """Merchant/amount pairs charged at a steady weekly-to-yearly cadence that are still active."""
+    # Integer series codes: merchant (case-insensitive) combined with the amount in cents
+    merchants, names = pd.factorize(df["Description"].fillna("").astype(str))
+    merchants = pd.factorize(names.str.strip().str.lower())[0][merchants]
+    cents = np.round(df["Amount"].to_numpy(dtype=float) * 100).astype(np.int64)
+    days = df["Date"].to_numpy(dtype="datetime64[D]").astype(np.int64)
+    descriptions, categories = df["Description"].to_numpy(), df["Category"].to_numpy()
+
+    def describe(i):
+        return str(descriptions[i]).strip(), categories[i], cents[i] / 100
+
+    return _recurring(_series_codes(merchants, cents), days, describe)
+
+
+def month_over_month(daily, days=MOM_DAYS, windows=MOM_BASELINE_WINDOWS, min_change=MOM_MIN_CHANGE):
+    """Per-category change of the last ``days`` against the average of the ``windows`` before it.
+
+    Daily category totals are turned into prefix sums once, so every window total is a
+    single subtraction regardless of how many transactions it covers.
+    """
+    end = len(daily)
+    windows = min(windows, end // days - 1)
+    if windows < 1:
+        return []
+
+    prefix = np.vstack([np.zeros(daily.shape[1]), daily.to_numpy().cumsum(axis=0)])
+    current = prefix[end] - prefix[end - days]
+    baseline = (prefix[end - days] - prefix[end - (windows + 1) * days]) / windows
+    previous = prefix[end - days] - prefix[end - 2 * days]
+    delta = current - baseline
+
+    findings = []
+    for index, category in enumerate(daily.columns):
+        change = delta[index] / baseline[index] if baseline[index] else np.inf
+        if abs(delta[index]) < MIN_IMPACT or abs(change) < min_change:
+            continue
+        trend = "new spending" if np.isinf(change) else f"{change:+.0%}"
+        findings.append(
+            {
+                "kind": "change",
+                "subject": category,
+                "impact": float(abs(delta[index])),
+                "text": (
+                    f"Change: {category} ${current[index]:,.2f} in the last {days} days vs. "
+                    f"${baseline[index]:,.2f} average over the previous {windows} "
+                    f"(${previous[index]:,.2f} in the {days} days before; {trend})"
+                ),
+            }
+        )
+    return findings
+
+
+def _rank(findings, limit):
+    return sorted(findings, key=lambda finding: finding["impact"], reverse=True)[:limit]
+
+
+def detect_patterns(df, limit=MAX_FINDINGS):
+    """Spikes, recurring charges and month-over-month changes, ranked by approximate dollars per month."""
+    df = prepare_transactions(df)
+    if df.empty:
+        return []
+    daily = daily_totals(df)
+    return _rank(category_spikes(daily) + recurring_charges(df) + month_over_month(daily), limit)
+
+
+class PatternAccumulator:
+    """Folds transaction chunks into what pattern detection needs, so ingestion stays chunked.
+
+    Keeps per-(day, category) totals, bounded by days x categories, and three integers per
+    transaction (merchant code, amount in cents, day) for recurring-charge detection; the
+    raw rows themselves are never held.
+    """
+
+    def __init__(self):
+        self._daily = None
+        self._merchant_codes = {}
+        self._merchants = []  # code -> (first description seen, its category)
+        self._series = []
+
+    def update(self, df):
+        """Fold one chunk of (already categorised) transactions in."""
+        df = prepare_transactions(df)
+        if df.empty:
+            return self
+        daily = df.groupby([df["Date"].dt.normalize(), "Category"])["Amount"].sum()
+        self._daily = daily if self._daily is None else self._daily.add(daily, fill_value=0.0)
+
+        local, names = pd.factorize(df["Description"].fillna("").astype(str))
+        first_rows = pd.Series(np.arange(len(local))).groupby(local).first().to_numpy()
+        mapping = np.empty(len(names), dtype=np.int64)
+        for index, key in enumerate(names.str.strip().str.lower()):
+            code = self._merchant_codes.get(key)
+            if code is None:
+                code = self._merchant_codes[key] = len(self._merchants)
+                row = first_rows[index]
+                self._merchants.append((str(names[index]).strip(), df["Category"].iloc[row]))
+            mapping[index] = code
+        self._series.append(
+            np.column_stack(
+                [
+                    mapping[local],
+                    np.round(df["Amount"].to_numpy(dtype=float) * 100).astype(np.int64),
+                    df["Date"].to_numpy(dtype="datetime64[D]").astype(np.int64),
+                ]
+            )
+        )
+        return self
+
+    def findings(self, limit=MAX_FINDINGS):
+        """Ranked findings over everything folded in so far (same as :func:`detect_patterns`)."""
+        if self._daily is None:
+            return []
+        daily = _daily_frame(self._daily)
+        merchants, cents, days = np.concatenate(self._series).T
+
+        def describe(i):
+            merchant, category = self._merchants[merchants[i]]
+            return merchant, category, cents[i] / 100
+
+        recurring = _recurring(_series_codes(merchants, cents), days, describe)
+        return _rank(category_spikes(daily) + recurring + month_over_month(daily), limit)
+
+
+def format_patterns(findings):
+    """Numbered findings for the "Detected Patterns" prompt section, or "" when there are none."""
+    if not findings:
+        return ""
+    lines = [PATTERNS_GUIDANCE]
+    lines += [f"{rank}. {finding['text']}" for rank, finding in enumerate(findings, start=1)]
+    return "\n".join(lines)
@@ -0,0 +1,164 @@
+import io
+import re
+
+import pandas as pd
+
+from analytics import SPENDING_COLUMNS, format_summary, summarize_spending
+
+try:
+    import tiktoken
+except ImportError:  # optional: fall back to a character-based estimate
+    tiktoken = None
+
+
+# Total tokens we aim to send per request (instructions + prompt), leaving room for the report
+CONTEXT_TOKEN_BUDGET = 12_000
+RESERVED_OUTPUT_TOKENS = 2_000
+
+# Amounts on a pasted line: "$"-prefixed ones win; bare numbers count only when there are none.
+# Dates ("2024-01-05", "2025-01", "01/05/2024") and digits glued to letters ("401k", "x3") are not amounts.
+DOLLAR_PATTERN = re.compile(r"\$\s?(\d[\d,]*(?:\.\d+)?)")
+NUMBER_PATTERN = re.compile(r"(?<![\w.$])(\d[\d,]*(?:\.\d+)?)(?![\w$])")
+DATE_PATTERN = re.compile(r"(?<!\w)(?:\d{4}-\d{1,2}(?:-\d{1,2})?|\d{1,2}/\d{1,2}/\d{2,4})(?!\w)")
+
+_encoding = None
+
+
+def count_tokens(text):
+    """Count tokens locally with tiktoken's cl100k_base encoding, or estimate ~4 characters per token."""
+    global _encoding
+    if tiktoken is not None and _encoding is None:
+        try:
+            _encoding = tiktoken.get_encoding("cl100k_base")
+        except Exception:  # encoding files unavailable offline
+            _encoding = False
+    if _encoding:
+        return len(_encoding.encode(text))
+    return max(1, len(text) // 4) if text else 0
+
+
+def prompt_token_budget(instructions, context_budget=CONTEXT_TOKEN_BUDGET, reserved_output=RESERVED_OUTPUT_TOKENS):
+    """Tokens left for the user prompt once the agent instructions and the report are accounted for."""
+    return max(500, context_budget - reserved_output - count_tokens(instructions))
+
+
+def parse_history_text(text):
+    """Parse pasted transaction rows (with or without a header) into a frame, or None if they are not CSV."""
+    first_line = text.split("\n", 1)[0].lower()
+    has_header = "date" in first_line and "amount" in first_line
+    try:
+        df = pd.read_csv(
+            io.StringIO(text),
+            header=0 if has_header else None,
+            names=None if has_header else SPENDING_COLUMNS,
+            skipinitialspace=True,
+            on_bad_lines="skip",
+        )
+    except Exception:
+        return None
+    if not {"Date", "Amount"}.issubset(df.columns):
+        return None
+    df["Amount"] = df["Amount"].astype(str).str.replace(r"[$,\s]", "", regex=True)
+    return df
+
+
+def aggregate_history(text):
+    """Replace pasted transaction rows with their local per-category summary when they parse as CSV."""
+    df = parse_history_text(text)
+    if df is None:
+        return text
+    summary = summarize_spending(df)
+    if summary["transactions"] == 0:
+        return text
+    return format_summary(summary)
+
+
+def dedupe_lines(text):
+    """Collapse repeated lines (e.g. the same recurring expense pasted every month) into one with a count."""
+    counts = {}
+    first_seen = {}
+    for line in text.split("\n"):
+        key = " ".join(line.lower().split())
+        if not key:
+            continue
+        counts[key] = counts.get(key, 0) + 1
+        first_seen.setdefault(key, line.strip())
+    return "\n".join(
+        first_seen[key] if count == 1 else f"{first_seen[key]} (x{count})" for key, count in counts.items()
+    )
+
+
+def line_value(line):
+    """Largest amount mentioned on a line, used to decide which rows are cheapest to drop.
+
+    Dollar amounts are preferred; otherwise the largest bare number that is not part of a
+    date or a word.
+    """
+    matches = DOLLAR_PATTERN.findall(line) or NUMBER_PATTERN.findall(DATE_PATTERN.sub(" ", line))
+    amounts = [float(match.replace(",", "")) for match in matches]
+    return max(amounts) if amounts else 0.0
+
+
+def truncate_low_value(text, max_tokens):
+    """Drop the lowest-amount lines until the section fits in ``max_tokens``."""
+    lines = text.split("\n")
+    line_tokens = [count_tokens(line) + 1 for line in lines]
+    total = sum(line_tokens)
+    dropped = set()
+    for index in sorted(range(len(lines)), key=lambda i: line_value(lines[i])):
+        if total <= max_tokens or len(dropped) == len(lines) - 1:
+            break
+        dropped.add(index)
+        total -= line_tokens[index]
+    kept = [line for index, line in enumerate(lines) if index not in dropped]
+    if dropped:
+        kept.append(f"... {len(dropped)} lower-value lines omitted")
+    result = "\n".join(kept)
+    if count_tokens(result) > max_tokens:
+        # A single oversized line: fall back to a hard character cut
+        result = result[: max(0, max_tokens) * 4] + " ..."
+    return result
+
+
+def _prompt_tokens(sections):
+    return count_tokens("\n\n".join(f"## {title}\n{text}" for title, text in sections.items()))
+
+
+def compact_sections(sections, token_budget):
+    """Progressively compact ``{title: text}`` sections until the assembled prompt fits ``token_budget``.
+
+    Steps, applied only while the prompt is still over budget: aggregate the spending history,
+    dedupe recurring lines, then drop the lowest-value rows from the largest sections. Returns the
+    compacted sections and per-section ``original_tokens`` / ``final_tokens`` / ``steps`` stats.
+    """
+    sections = dict(sections)
+    stats = {title: {"original_tokens": count_tokens(text), "steps": []} for title, text in sections.items()}
+
+    def apply(step, title, transform):
+        if title in sections and _prompt_tokens(sections) > token_budget:
+            compacted = transform(sections[title])
+            if compacted != sections[title]:
+                sections[title] = compacted
+                stats[title]["steps"].append(step)
+
+    apply("aggregate", "Spending History", aggregate_history)
+    for title in ("Spending History", "Expense Items", "Income Sources"):
+        apply("dedupe", title, dedupe_lines)
+    for title in sorted(sections, key=lambda t: count_tokens(sections[t]), reverse=True):
+        excess = _prompt_tokens(sections) - token_budget
+        if excess > 0:
+            target = max(50, count_tokens(sections[title]) - excess)
+            apply("truncate", title, lambda text: truncate_low_value(text, target))
+
+    for title, text in sections.items():
+        stats[title]["final_tokens"] = count_tokens(text)
+    return sections, stats
+
+
+def format_compression(stats):
+    """One line per compacted section, e.g. for a caption under the report."""
+    return [
+        f"{title}: {s['original_tokens']} -> {s['final_tokens']} tokens ({', '.join(s['steps'])})"
+        for title, s in stats.items()
+        if s["steps"]
+    ]
@@ -0,0 +1,193 @@
+import asyncio
+import re
+
+from budget_agent import BUDGET_FALLBACK_MODELS, BUDGET_MODEL
+from dispatcher import get_dispatcher
+from metrics import metrics
+from prompt_planner import compact_sections, line_value
+from resources import get_agent, get_run_config
+from router import get_router
+
+
+SECTION_PERSONA = """You are a precise, data-driven and supportive budget analyst writing one section of a Budget Health Report.
+Ground every statement in the figures provided and frame insights as observations, not judgments.
+Never give investment, tax or legal advice, and never project beyond the data provided."""
+
+INSIGHTS_INSTRUCTIONS = SECTION_PERSONA + """
+
+Write only the body of the "Key Insights & Recommendations" section: a numbered list of 2-3 specific, data-driven insights, each followed by a concrete recommendation (e.g. "Insight: You spent 30% more on ride-sharing this month than last. Recommendation: ...").
+Do not repeat the heading and do not write any other section."""
+
+GOALS_INSTRUCTIONS = SECTION_PERSONA + """
+
+Write only the body of the "Goal Progress" section: a short status update on each stated financial goal, based on the net savings in the budget overview.
+Do not repeat the heading and do not write any other section."""
+
+BAR_WIDTH = 20
+
+
+def _money(value):
+    return "—" if value is None else f"${value:,.2f}"
+
+
+def _signed_money(value):
+    return "—" if value is None else f"{'+' if value >= 0 else '-'}${abs(value):,.2f}"
+
+
+def _report_period(summary):
+    """Position and label of the period the tables describe, or ``(None, None)`` without a history.
+
+    That is the latest period the history covers in full: a history ending mid-month would
+    otherwise understate expenses (and overstate net savings). Only when no period is
+    complete is the latest one used, labelled as partial.
+    """
+    if summary is None or summary["by_period"] is None or not len(summary["by_period"]):
+        return None, None
+    periods = summary["by_period"].index
+    start, end = summary["start"].normalize(), summary["end"].normalize()
+    complete = [
+        position
+        for position, period in enumerate(periods)
+        if start <= period.start_time and end >= period.end_time.normalize()
+    ]
+    if complete:
+        return complete[-1], f"Period: {periods[complete[-1]]} (latest complete period)"
+    return len(periods) - 1, f"Period: {periods[-1]} (partial, {start:%Y-%m-%d} to {end:%Y-%m-%d})"
+
+
+def budget_overview(income, expenses, summary=None):
+    """Total Income / Total Expenses / Net Savings table, computed locally.
+
+    Expenses come from the latest complete period of the spending history when there is one,
+    otherwise from the listed expense items.
+    """
+    total_income = sum(line_value(line) for line in income.splitlines()) or None
+    position, label = _report_period(summary)
+    if position is not None:
+        total_expenses = float(summary["by_period"]["total"].iloc[position])
+    else:
+        total_expenses = sum(line_value(line) for line in expenses.splitlines()) or None
+        label = "Period: monthly (from listed expense items)"
+    net = total_income - total_expenses if total_income is not None and total_expenses is not None else None
+
+    table = "\n".join(
+        [
+            label,
+            "",
+            "| Metric | Amount |",
+            "|---|---|",
+            f"| Total Income | {_money(total_income)} |",
+            f"| Total Expenses | {_money(total_expenses)} |",
+            f"| Net Savings | {_signed_money(net)} |",
+        ]
+    )
+    return table, {"income": total_income, "expenses": total_expenses, "net": net}
+
+
+def budgeted_by_category(expenses, categories=()):
+    """Budgeted amount per category from "Item – Category – $amount" style expense lines."""
+    known = {category.lower(): category for category in categories}
+    budgets = {}
+    for line in expenses.splitlines():
+        amount = line_value(line)
+        if not amount:
+            continue
+        parts = [part.strip() for part in re.split(r"\s+[–—-]\s+", line) if part.strip()]
+        if len(parts) >= 3:
+            category = known.get(parts[1].lower(), parts[1])
+        else:
+            category = next((name for key, name in known.items() if key in line.lower()), None)
+        if category:
+            budgets[category] = budgets.get(category, 0.0) + amount
+    return budgets
+
+
+def spending_analysis(expenses, summary=None):
+    """Category | Budgeted Amount | Actual Spent | Variance table with ASCII bars, computed locally."""
+    actual = {}
+    position, _ = _report_period(summary)
+    if position is not None:
+        actual = summary["category_by_period"].iloc[position]
+        actual = {category: float(value) for category, value in actual.items() if value}
+    budgets = budgeted_by_category(expenses, actual.keys())
+
+    categories = sorted(
+        set(actual) | set(budgets), key=lambda c: (actual.get(c, 0.0), budgets.get(c, 0.0)), reverse=True
+    )
+    if not categories:
+        return "No categorised spending or budgeted expenses were provided."
+
+    largest = max(list(actual.values()) + [0.0]) or 1.0
+    rows = ["| Category | Budgeted Amount | Actual Spent | Variance |", "|---|---|---|---|"]
+    for category in categories:
+        spent = actual.get(category)
+        budget = budgets.get(category)
+        bar = "█" * round(BAR_WIDTH * (spent or 0.0) / largest)
+        variance = budget - (spent or 0.0) if budget is not None else None
+        rows.append(f"| {category} | {_money(budget)} | {_money(spent)} {bar} | {_signed_money(variance)} |")
+    return "\n".join(rows)
+
+
+async def _write_section(name, instructions, prompt, run_config):
+    agent = get_agent(name=name, instructions=instructions, model=BUDGET_MODEL)
+
+    async def run():
+        with metrics.stage("section_" + re.sub(r"\W+", "_", name.lower()).strip("_")):
+            result = await get_router().run(
+                agent, prompt, run_config or get_run_config(), models=[agent.model, *BUDGET_FALLBACK_MODELS]
+            )
+        metrics.record_usage(result.context_wrapper.usage)
+        return str(result.final_output).strip()
+
+    return await get_dispatcher().submit((id(agent), id(run_config) if run_config else None, prompt), run)
+
+
+async def generate_report(
+    income,
+    expenses,
+    goals,
+    spending_history_text,
+    summary=None,
+    token_budget=None,
+    run_config=None,
+    detected_patterns="",
+):
+    """Build the Budget Health Report with local tables and concurrently generated narrative sections.
+
+    The overview and spending tables are computed without the model; the two narrative sections
+    run as separate, smaller agent calls in parallel, so latency tracks the slowest section.
+    """
+    overview, _ = budget_overview(income, expenses, summary)
+    analysis = spending_analysis(expenses, summary)
+
+    inputs = {
+        "Expense Items": expenses.strip(),
+        "Financial Goals": goals.strip(),
+        "Detected Patterns": detected_patterns.strip(),
+        "Spending History": spending_history_text.strip(),
+    }
+    inputs = {title: text for title, text in inputs.items() if text}
+    if token_budget is not None:
+        inputs, _ = compact_sections(inputs, token_budget)
+
+    tables = f"## Budget Overview\n{overview}\n\n## Spending Analysis\n{analysis}"
+    insights_titles = ("Expense Items", "Detected Patterns", "Spending History")
+    insights_prompt = tables + "".join(
+        f"\n\n## {title}\n{inputs[title]}" for title in insights_titles if title in inputs
+    )
+    jobs = [_write_section("Insights Writer", INSIGHTS_INSTRUCTIONS, insights_prompt, run_config)]
+    if "Financial Goals" in inputs:
+        goals_prompt = f"## Budget Overview\n{overview}\n\n## Financial Goals\n{inputs['Financial Goals']}"
+        jobs.append(_write_section("Goal Progress Writer", GOALS_INSTRUCTIONS, goals_prompt, run_config))
+
+    bodies = await asyncio.gather(*jobs)
+    goal_progress = bodies[1] if len(bodies) > 1 else "No financial goals were provided."
+
+    return "\n\n".join(
+        [
+            f"## Budget Overview\n{overview}",
+            f"## Spending Analysis\n{analysis}",
+            f"## Key Insights & Recommendations\n{bodies[0]}",
+            f"## Goal Progress\n{goal_progress}",
+        ]
+    )
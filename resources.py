@@ -0,0 +1,107 @@
+import asyncio
+import contextvars
+import os
+import threading
+
+import httpx
+from agents import Agent, RunConfig
+from agents.models.openai_provider import OpenAIProvider
+from openai import AsyncOpenAI
+
+
+OPENROUTER_BASE_URL = "https://openrouter.ai/api/v1"
+
+# Process-wide singletons. Imported modules survive Streamlit reruns, so these are
+# built once per process and shared by app.py, budget_manager_app.py and main.py.
+_lock = threading.RLock()
+_loop = None
+_client = None
+_provider = None
+_agents = {}
+
+
+def get_event_loop():
+    """Return the persistent background event loop, starting its thread on first use."""
+    global _loop
+    with _lock:
+        if _loop is None:
+            loop = asyncio.new_event_loop()
+            threading.Thread(target=loop.run_forever, name="agent-event-loop", daemon=True).start()
+            _loop = loop
+        return _loop
+
+
+def run_coroutine(coro, timeout=None):
+    """Run ``coro`` on the background loop from synchronous code and wait for its result.
+
+    Context variables set by the caller (e.g. the metrics trace) are carried over to the loop.
+    """
+    context = contextvars.copy_context()
+
+    async def with_caller_context():
+        for var, value in context.items():
+            var.set(value)
+        return await coro
+
+    return asyncio.run_coroutine_threadsafe(with_caller_context(), get_event_loop()).result(timeout)
+
+
+def iterate_on_loop(agen):
+    """Drive an async generator on the background loop, yielding its items in the calling thread.
+
+    Streamlit elements must be updated from the script thread, so streamed output is
+    pulled across one item at a time instead of being rendered inside the loop.
+    """
+    async def next_item():
+        return await agen.__anext__()
+
+    while True:
+        try:
+            yield run_coroutine(next_item())
+        except StopAsyncIteration:
+            return
+
+
+def get_client():
+    """Return the shared AsyncOpenAI client for OpenRouter, backed by a pooled keep-alive transport."""
+    global _client
+    with _lock:
+        if _client is None:
+            max_connections = int(os.environ.get("OPENROUTER_MAX_CONNECTIONS", 20))
+            http_client = httpx.AsyncClient(
+                limits=httpx.Limits(
+                    max_connections=max_connections,
+                    max_keepalive_connections=max_connections,
+                    keepalive_expiry=120,
+                ),
+                timeout=httpx.Timeout(120.0, connect=10.0),
+            )
+            _client = AsyncOpenAI(
+                base_url=os.environ.get("OPENROUTER_API_BASE", OPENROUTER_BASE_URL),
+                api_key=os.environ["OPENROUTER_API_KEY"],
+                http_client=http_client,
+            )
+        return _client
+
+
+def get_provider():
+    """Return the shared OpenAIProvider wrapping :func:`get_client`."""
+    global _provider
+    with _lock:
+        if _provider is None:
+            _provider = OpenAIProvider(openai_client=get_client())
+        return _provider
+
+
+def get_run_config():
+    """RunConfig that routes agent calls through the shared provider."""
+    return RunConfig(model_provider=get_provider())
+
+
+def get_agent(name, instructions, model):
+    """Return the Agent for this configuration, building it only the first time it is requested."""
+    key = (name, instructions, model)
+    with _lock:
+        if key not in _agents:
+            _agents[key] = Agent(name=name, instructions=instructions, model=model)
+        return _agents[key]
@@ -0,0 +1,134 @@
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+
+from metrics import metrics
+
+
+def normalize_prompt(prompt):
+    """Normalise line endings and surrounding whitespace so equivalent prompts hash the same."""
+    lines = prompt.replace("\r\n", "\n").replace("\r", "\n").split("\n")
+    return "\n".join(line.rstrip() for line in lines).strip()
+
+
+def cache_key(prompt, instructions, model):
+    """Content-addressed key over the normalised prompt, agent instructions and model name."""
+    digest = hashlib.sha256()
+    for part in (normalize_prompt(prompt), instructions or "", str(model or "")):
+        digest.update(part.encode("utf-8"))
+        digest.update(b"\x00")
+    return digest.hexdigest()
+
+
+class ResponseCache:
+    """Two-tier (in-process LRU + on-disk JSON) cache for agent responses."""
+
+    def __init__(self, directory=".cache/reports", max_entries=128, max_disk_entries=1000, ttl=24 * 3600):
+        self.directory = directory
+        self.max_entries = max_entries
+        self.max_disk_entries = max_disk_entries
+        self.ttl = ttl
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        self.stats = {"memory_hits": 0, "disk_hits": 0, "misses": 0, "seconds_saved": 0.0}
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+    def _path(self, key):
+        return os.path.join(self.directory, f"{key}.json")
+
+    def _expired(self, entry):
+        return self.ttl is not None and time.time() - entry["created"] > self.ttl
+
+    def _remember(self, key, entry):
+        self._memory[key] = entry
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
+
+    def _read_disk(self, key):
+        if not self.directory:
+            return None
+        try:
+            with open(self._path(key), encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def _write_disk(self, key, entry):
+        if not self.directory:
+            return
+        tmp_path = self._path(key) + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(entry, f)
+        os.replace(tmp_path, self._path(key))
+        self._prune_disk()
+
+    def _prune_disk(self):
+        entries = [
+            os.path.join(self.directory, name)
+            for name in os.listdir(self.directory)
+            if name.endswith(".json")
+        ]
+        if len(entries) <= self.max_disk_entries:
+            return
+        entries.sort(key=os.path.getmtime)
+        for path in entries[: len(entries) - self.max_disk_entries]:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+    def get(self, key):
+        """Return the cached response for ``key`` or ``None``, updating the hit/miss counters."""
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None and not self._expired(entry):
+                self._memory.move_to_end(key)
+                self.stats["memory_hits"] += 1
+                metrics.count("cache_memory_hits")
+                self.stats["seconds_saved"] += entry["elapsed"]
+                return entry["value"]
+            self._memory.pop(key, None)
+
+            entry = self._read_disk(key)
+            if entry is not None and not self._expired(entry):
+                self._remember(key, entry)
+                self.stats["disk_hits"] += 1
+                metrics.count("cache_disk_hits")
+                self.stats["seconds_saved"] += entry["elapsed"]
+                return entry["value"]
+
+            self.stats["misses"] += 1
+            metrics.count("cache_misses")
+            return None
+
+    def set(self, key, value, elapsed=0.0):
+        """Store ``value`` in both tiers; ``elapsed`` is the generation time a later hit saves."""
+        entry = {"value": value, "elapsed": elapsed, "created": time.time()}
+        with self._lock:
+            self._remember(key, entry)
+            self._write_disk(key, entry)
+
+    def get_or_compute(self, key, compute):
+        """Synchronous counterpart of :meth:`get_or_generate` for callers outside the event loop."""
+        cached = self.get(key)
+        if cached is not None:
+            return cached
+        started = time.perf_counter()
+        value = compute()
+        self.set(key, value, elapsed=time.perf_counter() - started)
+        return value
+
+    async def get_or_generate(self, key, generate):
+        """Return the cached response for ``key``, awaiting ``generate()`` on a miss."""
+        cached = self.get(key)
+        if cached is not None:
+            return cached
+        started = time.perf_counter()
+        value = await generate()
+        self.set(key, value, elapsed=time.perf_counter() - started)
+        return value
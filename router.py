@@ -0,0 +1,272 @@
+import asyncio
+import threading
+import time
+from collections import defaultdict, deque
+from dataclasses import replace
+
+from agents import Runner
+from openai.types.responses import ResponseTextDeltaEvent
+
+from dispatcher import get_dispatcher
+from metrics import RollingHistogram, metrics
+
+
+# A model is only demoted for errors once it has this many recent outcomes, so one blip does not move traffic
+MIN_ERROR_OUTCOMES = 3
+
+
+class ModelRouter:
+    """Runs an agent on the fastest of several interchangeable models, hedging and falling back.
+
+    Latency is tracked per (agent name, model) over a rolling window. Candidates with enough
+    samples are tried fastest-median first, the rest in the order given. When the running
+    request outlives the model's observed ``hedge_quantile`` latency, one duplicate goes to the
+    next candidate and whichever finishes first wins; the other is cancelled. Errors and
+    per-attempt ``timeout`` move on to the next candidate.
+
+    Attempts that time out, or are cancelled after running longer than the model's median,
+    are recorded at their elapsed time: a lower bound on their latency, but dropping them
+    would leave only the fast samples and pull the tail estimate down. Models whose recent
+    attempts fail at ``max_error_rate`` or more (errors and timeouts) are tried last.
+
+    :meth:`start_stream` does the same for streamed runs, racing to the first text delta.
+
+    Callers already hold a ``dispatcher`` slot for the request itself. A hedge is extra load, so
+    it is only sent when the dispatcher has a free slot and a rate-limit token to spare right
+    now (it holds that slot until it finishes); otherwise the request keeps waiting on the
+    model it started with. Fallbacks after an error replace the failed call in the caller's
+    slot but still take a rate-limit token.
+    """
+
+    def __init__(
+        self,
+        hedge_quantile=0.95,
+        min_samples=20,
+        timeout=120.0,
+        window=200,
+        dispatcher=None,
+        max_error_rate=0.5,
+        error_window=20,
+    ):
+        self.hedge_quantile = hedge_quantile
+        self.min_samples = min_samples
+        self.timeout = timeout
+        self.dispatcher = dispatcher
+        self.max_error_rate = max_error_rate
+        self.latency = defaultdict(lambda: RollingHistogram(window))
+        self.outcomes = defaultdict(lambda: deque(maxlen=error_window))  # True for each failed attempt
+        self._lock = threading.Lock()
+
+    def _percentile(self, agent_name, model, quantile):
+        with self._lock:
+            histogram = self.latency.get((agent_name, model))
+            if histogram is None or histogram.count < self.min_samples:
+                return None
+            return histogram.percentiles((quantile,))[quantile]
+
+    def error_rate(self, agent_name, model):
+        """Share of ``model``'s recent attempts that errored or timed out (0.0 until there are enough)."""
+        with self._lock:
+            outcomes = self.outcomes.get((agent_name, model))
+            if outcomes is None or len(outcomes) < MIN_ERROR_OUTCOMES:
+                return 0.0
+            return sum(outcomes) / len(outcomes)
+
+    def order(self, agent_name, models):
+        """Healthy candidates with a known median latency first (fastest first), then the rest as given.
+
+        Candidates failing at ``max_error_rate`` or more go after all the healthy ones.
+        """
+        medians = {model: self._percentile(agent_name, model, 0.5) for model in models}
+        failing = {model: self.error_rate(agent_name, model) >= self.max_error_rate for model in models}
+        return sorted(models, key=lambda model: (failing[model], medians[model] is None, medians[model] or 0.0))
+
+    def hedge_delay(self, agent_name, model):
+        """Seconds to wait on ``model`` before sending a duplicate, or None when it cannot be judged yet."""
+        if self.hedge_quantile is None:
+            return None
+        return self._percentile(agent_name, model, self.hedge_quantile)
+
+    def stats(self):
+        """Per-model latency percentiles, e.g. for the diagnostics panel."""
+        with self._lock:
+            return {
+                f"{agent_name} / {model}": {
+                    "count": histogram.count,
+                    "errors": sum(self.outcomes.get((agent_name, model), ())),
+                    **{f"p{int(q * 100)}": v for q, v in histogram.percentiles().items()},
+                }
+                for (agent_name, model), histogram in self.latency.items()
+            }
+
+    def _record(self, agent_name, model, seconds=None, failed=None):
+        with self._lock:
+            if seconds is not None:
+                self.latency[(agent_name, model)].observe(seconds)
+            if failed is not None:
+                self.outcomes[(agent_name, model)].append(failed)
+
+    async def _timed(self, name, model, call):
+        """Await ``call``, recording its latency and outcome under ``(name, model)``."""
+        started = time.perf_counter()
+        try:
+            result = await asyncio.wait_for(call, self.timeout)
+        except asyncio.CancelledError:
+            # Cancelled because another attempt won: only informative once it has outlived the median
+            elapsed = time.perf_counter() - started
+            median = self._percentile(name, model, 0.5)
+            if median is not None and elapsed >= median:
+                self._record(name, model, seconds=elapsed)
+            raise
+        except asyncio.TimeoutError:
+            self._record(name, model, seconds=time.perf_counter() - started, failed=True)
+            raise
+        except Exception:
+            self._record(name, model, failed=True)
+            raise
+        self._record(name, model, seconds=time.perf_counter() - started, failed=False)
+        return result
+
+    async def _attempt(self, agent, prompt, run_config, model):
+        return await self._timed(
+            agent.name, model, Runner.run(agent, prompt, run_config=replace(run_config, model=model))
+        )
+
+    async def _open_stream(self, agent, prompt, run_config, model):
+        """Start a streamed run on ``model`` and wait for its first text delta (or its end)."""
+        result = Runner.run_streamed(agent, prompt, run_config=replace(run_config, model=model))
+        deltas = _text_deltas(result)
+        try:
+            first = await self._timed(_stream_name(agent), model, _first_delta(deltas))
+        except BaseException:
+            result.cancel()
+            raise
+        return result, first, deltas
+
+    async def _race(self, name, candidates, attempt, discard=None):
+        """Await ``attempt(model)`` across ``candidates`` with hedging and fallback; return the first success.
+
+        ``discard`` is called with the result of any other attempt that also succeeded.
+        """
+        dispatcher = self.dispatcher or get_dispatcher()
+        primary = candidates[0]
+        remaining = list(candidates)
+        running = {}
+        errors = []
+        hedge_due = False  # the first attempt outlived its tail latency (once per request)
+        hedged = False
+
+        def launch(holds_slot=False):
+            model = remaining.pop(0)
+            task = asyncio.ensure_future(attempt(model))
+            if holds_slot:
+                task.add_done_callback(lambda _: dispatcher.release())
+            running[task] = model
+
+        launch()
+        try:
+            while running:
+                delay = None
+                if remaining and not hedge_due and len(running) == 1:
+                    delay = self.hedge_delay(name, next(iter(running.values())))
+                done, _ = await asyncio.wait(running, timeout=delay, return_when=asyncio.FIRST_COMPLETED)
+                if not done:
+                    # The request is already slower than this model's tail: race a duplicate against it,
+                    # unless that would push the provider past the dispatcher's concurrency or rate limits
+                    hedge_due = True
+                    if not dispatcher.try_acquire():
+                        metrics.count("model_hedges_skipped")
+                        continue
+                    hedged = True
+                    metrics.count("model_hedges")
+                    launch(holds_slot=True)
+                    continue
+                winner = None
+                for task in done:
+                    model = running.pop(task)
+                    if task.exception() is not None:
+                        errors.append(task.exception())
+                        metrics.count("model_errors")
+                    elif winner is None:
+                        winner = task
+                        if model != primary:
+                            metrics.count("model_hedge_wins" if hedged else "model_fallback_wins")
+                    elif discard is not None:
+                        discard(task.result())
+                if winner is not None:
+                    return winner.result()
+                if not running and remaining:
+                    await dispatcher.bucket.acquire()
+                    launch()
+            raise errors[-1]
+        finally:
+            for task in running:
+                task.cancel()
+            if running:
+                await asyncio.gather(*running, return_exceptions=True)
+
+    async def run(self, agent, prompt, run_config, models=None):
+        """``Runner.run`` across ``models`` (default: just the agent's own), returning the first success."""
+        candidates = self.order(agent.name, list(dict.fromkeys(models or [agent.model])))
+        return await self._race(
+            agent.name, candidates, lambda model: self._attempt(agent, prompt, run_config, model)
+        )
+
+    async def start_stream(self, agent, prompt, run_config, models=None):
+        """``Runner.run_streamed`` across ``models``, returning ``(result, deltas)`` once text starts.
+
+        Candidates race to their first text delta, with latency tracked as time to first token:
+        a stream that has not started by the model's usual tail is hedged, and errors before
+        the first token fall back to the next model. Once text is flowing the model is fixed.
+        ``deltas`` yields the winner's text deltas, starting with the first one.
+        """
+        name = _stream_name(agent)
+        candidates = self.order(name, list(dict.fromkeys(models or [agent.model])))
+        result, first, deltas = await self._race(
+            name,
+            candidates,
+            lambda model: self._open_stream(agent, prompt, run_config, model),
+            discard=lambda opened: opened[0].cancel(),
+        )
+        return result, _prepend(first, deltas, result)
+
+
+def _stream_name(agent):
+    # Time to first token is tracked apart from whole-run latency for the same agent and model
+    return f"{agent.name} (stream)"
+
+
+async def _text_deltas(result):
+    async for event in result.stream_events():
+        if event.type == "raw_response_event" and isinstance(event.data, ResponseTextDeltaEvent):
+            yield event.data.delta
+
+
+async def _first_delta(deltas):
+    try:
+        return await deltas.__anext__()
+    except StopAsyncIteration:
+        return None  # the run finished without any text
+
+
+async def _prepend(first, deltas, result):
+    try:
+        if first is not None:
+            yield first
+        async for delta in deltas:
+            yield delta
+    finally:
+        if not result.is_complete:
+            result.cancel()  # the caller stopped reading
+
+_lock = threading.Lock()
+_router = None
+
+
+def get_router():
+    """Return the process-wide router, so latency history is shared by every session."""
+    global _router
+    with _lock:
+        if _router is None:
+            _router = ModelRouter()
+        return _router
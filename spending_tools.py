@@ -0,0 +1,160 @@
+from functools import lru_cache
+from typing import List, Optional
+
+import pandas as pd
+from agents import function_tool
+
+from analytics import prepare_transactions
+
+
+TOOLS_GUIDANCE = (
+    "The full transaction history is available through the spending tools "
+    "(category_totals, date_range_sum, top_merchants, budget_variance). "
+    "Call them for any figure you report instead of estimating."
+)
+
+
+class SpendingTools:
+    """Vectorised queries over one session's spending history, exposed as agent function tools.
+
+    The history is held as a Date-indexed frame; every query is memoised on the instance, so
+    repeated tool calls within a session (and across reruns of the same report) are free.
+    """
+
+    def __init__(self, df):
+        df = prepare_transactions(df)[["Date", "Description", "Amount", "Category"]].copy()
+        df["Description"] = df["Description"].fillna("").astype(str).str.strip().astype("category")
+        df["Category"] = df["Category"].astype("category")
+        self.df = df.set_index("Date").sort_index()
+        self.fingerprint = str(int(pd.util.hash_pandas_object(self.df.reset_index(), index=False).sum()))
+
+        self.category_totals = lru_cache(maxsize=256)(self._category_totals)
+        self.date_range_sum = lru_cache(maxsize=256)(self._date_range_sum)
+        self.top_merchants = lru_cache(maxsize=256)(self._top_merchants)
+        self.budget_variance = lru_cache(maxsize=256)(self._budget_variance)
+
+    def _slice(self, start_date=None, end_date=None, category=None):
+        df = self.df.loc[start_date:end_date] if (start_date or end_date) else self.df
+        if category:
+            df = df[df["Category"].astype(str).str.lower() == category.strip().lower()]
+        return df
+
+    def _category_totals(self, start_date=None, end_date=None):
+        grouped = self._slice(start_date, end_date).groupby("Category", observed=True)["Amount"]
+        totals = grouped.agg(total="sum", count="count", mean="mean").sort_values("total", ascending=False)
+        return [
+            {
+                "category": str(category),
+                "total": round(row["total"], 2),
+                "count": int(row["count"]),
+                "mean": round(row["mean"], 2),
+            }
+            for category, row in totals.iterrows()
+        ]
+
+    def _date_range_sum(self, start_date=None, end_date=None, category=None):
+        amounts = self._slice(start_date, end_date, category)["Amount"]
+        return {
+            "start_date": start_date,
+            "end_date": end_date,
+            "category": category,
+            "total": round(float(amounts.sum()), 2),
+            "count": int(amounts.size),
+        }
+
+    def _top_merchants(self, limit=5, category=None, start_date=None, end_date=None):
+        grouped = self._slice(start_date, end_date, category).groupby("Description", observed=True)["Amount"]
+        top = grouped.agg(total="sum", count="count").nlargest(limit, "total")
+        return [
+            {"merchant": str(merchant), "total": round(row["total"], 2), "count": int(row["count"])}
+            for merchant, row in top.iterrows()
+        ]
+
+    def _budget_variance(self, categories, budgets):
+        """Compare monthly budgets with average actual monthly spend per category."""
+        monthly = (
+            self.df.groupby([self.df.index.to_period("M"), "Category"], observed=True)["Amount"]
+            .sum()
+            .unstack(fill_value=0.0)
+        )
+        actual = monthly.mean() if len(monthly) else pd.Series(dtype=float)
+        actual.index = actual.index.astype(str).str.lower()
+        rows = []
+        for category, budget in zip(categories, budgets):
+            spent = float(actual.get(category.strip().lower(), 0.0))
+            rows.append(
+                {
+                    "category": category,
+                    "budgeted": round(budget, 2),
+                    "actual_monthly_average": round(spent, 2),
+                    "variance": round(budget - spent, 2),
+                }
+            )
+        return rows
+
+    def overview(self):
+        """Short description of the dataset for the prompt, in place of the rows themselves."""
+        if self.df.empty:
+            return "No valid transactions found in the uploaded history."
+        categories = ", ".join(sorted(self.df["Category"].astype(str).unique()))
+        return (
+            f"Transactions: {len(self.df)} ({self.df.index.min():%Y-%m-%d} to {self.df.index.max():%Y-%m-%d}), "
+            f"total spent {self.df['Amount'].sum():,.2f}\n"
+            f"Categories: {categories}\n"
+            f"{TOOLS_GUIDANCE}"
+        )
+
+    def as_tools(self):
+        """Wrap the memoised queries as agents SDK function tools bound to this history."""
+
+        @function_tool
+        def category_totals(start_date: Optional[str] = None, end_date: Optional[str] = None) -> list:
+            """Total, count and mean spent per category, largest first.
+
+            Args:
+                start_date: First day to include (YYYY-MM-DD), or null for the start of the history.
+                end_date: Last day to include (YYYY-MM-DD), or null for the end of the history.
+            """
+            return self.category_totals(start_date, end_date)
+
+        @function_tool
+        def date_range_sum(
+            start_date: Optional[str] = None, end_date: Optional[str] = None, category: Optional[str] = None
+        ) -> dict:
+            """Total spent and number of transactions in a date range, optionally for one category.
+
+            Args:
+                start_date: First day to include (YYYY-MM-DD), or null for the start of the history.
+                end_date: Last day to include (YYYY-MM-DD), or null for the end of the history.
+                category: Category name to restrict to, or null for all categories.
+            """
+            return self.date_range_sum(start_date, end_date, category)
+
+        @function_tool
+        def top_merchants(
+            limit: int = 5,
+            category: Optional[str] = None,
+            start_date: Optional[str] = None,
+            end_date: Optional[str] = None,
+        ) -> list:
+            """Merchants with the highest total spend.
+
+            Args:
+                limit: How many merchants to return.
+                category: Category name to restrict to, or null for all categories.
+                start_date: First day to include (YYYY-MM-DD), or null for the start of the history.
+                end_date: Last day to include (YYYY-MM-DD), or null for the end of the history.
+            """
+            return self.top_merchants(limit, category, start_date, end_date)
+
+        @function_tool
+        def budget_variance(categories: List[str], budgets: List[float]) -> list:
+            """Budgeted vs. average actual monthly spend per category (positive variance = under budget).
+
+            Args:
+                categories: Category names, in the same order as budgets.
+                budgets: Monthly budget for each category.
+            """
+            return self.budget_variance(tuple(categories), tuple(budgets))
+
+        return [category_totals, date_range_sum, top_merchants, budget_variance]
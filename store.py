@@ -0,0 +1,229 @@
+import os
+import sqlite3
+import threading
+from datetime import datetime
+
+import pandas as pd
+
+from analytics import SpendingAggregator, format_summary, prepare_transactions, summarize_spending
+
+
+DEFAULT_ACCOUNT = "default"
+
+# Category prepare_transactions gives rows nothing could label
+UNCATEGORISED = "Uncategorised"
+
+# Bumped when the layout changes; older stores are rebuilt from the next upload
+SCHEMA_VERSION = 3
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS transactions (
+    account TEXT NOT NULL,
+    date TEXT NOT NULL,
+    description TEXT NOT NULL,
+    amount REAL NOT NULL,
+    category TEXT NOT NULL,
+    occurrence INTEGER NOT NULL,
+    PRIMARY KEY (account, date, description, amount, occurrence)
+);
+CREATE INDEX IF NOT EXISTS transactions_account_date ON transactions (account, date);
+CREATE TABLE IF NOT EXISTS period_totals (
+    account TEXT NOT NULL,
+    period TEXT NOT NULL,
+    category TEXT NOT NULL,
+    total REAL NOT NULL,
+    count INTEGER NOT NULL,
+    PRIMARY KEY (account, period, category)
+);
+CREATE TABLE IF NOT EXISTS reports (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    account TEXT NOT NULL,
+    created TEXT NOT NULL,
+    last_rowid INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS reports_account ON reports (account, id);
+"""
+
+# Version 1 stores held every session's rows under one key and cannot be split by account;
+# version 2 collapsed repeat purchases and kept anonymous browser sessions' uploads
+LEGACY_TABLES = ("transactions", "period_totals", "reports")
+
+
+class TransactionStore:
+    """SQLite store of transactions deduplicated on Date + Description + Amount + occurrence, per account.
+
+    The occurrence is the row's ordinal among identical Date/Description/Amount rows in the
+    same upload, so re-uploading an export adds nothing while two identical purchases on the
+    same day are both kept.
+
+    Monthly per-category totals are maintained incrementally as rows arrive, and each
+    generated report records a high-water mark so the next prompt only covers newer rows.
+    Every query is scoped to ``account``; use :meth:`for_account` to get a view of another
+    account that shares the same connection.
+    """
+
+    def __init__(self, path=".cache/transactions.sqlite3", account=DEFAULT_ACCOUNT):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.path = path
+        self.account = account
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._migrate()
+        self._lock = threading.Lock()
+
+    def _migrate(self):
+        with self._conn:
+            if self._conn.execute("PRAGMA user_version").fetchone()[0] < SCHEMA_VERSION:
+                for table in LEGACY_TABLES:
+                    self._conn.execute(f"DROP TABLE IF EXISTS {table}")
+            self._conn.executescript(SCHEMA)
+            self._conn.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+
+    def for_account(self, account):
+        """A view of ``account``'s rows, totals and reports on the same connection."""
+        view = object.__new__(TransactionStore)
+        view.__dict__.update(self.__dict__, account=account)
+        return view
+
+    def _max_rowid(self):
+        return self._conn.execute(
+            "SELECT COALESCE(MAX(rowid), 0) FROM transactions WHERE account = ?", (self.account,)
+        ).fetchone()[0]
+
+    def add(self, df, occurrences=None):
+        """Insert rows not already stored, fold them into the period totals and return how many were new.
+
+        ``occurrences`` counts the Date/Description/Amount keys seen so far in this upload; pass
+        the same dict for every chunk of one file so repeats split across chunks are numbered
+        consistently.
+        """
+        df = prepare_transactions(df)
+        occurrences = {} if occurrences is None else occurrences
+        records = []
+        for date, description, amount, category in zip(
+            df["Date"].dt.strftime("%Y-%m-%d"),
+            df["Description"].fillna("").astype(str).str.strip(),
+            df["Amount"].round(2).astype(float),
+            df["Category"],
+        ):
+            key = (date, description, amount)
+            occurrence = occurrences.get(key, 0)
+            occurrences[key] = occurrence + 1
+            records.append((self.account, date, description, amount, category, occurrence))
+        with self._lock, self._conn:
+            before = self._max_rowid()
+            self._conn.executemany(
+                "INSERT OR IGNORE INTO transactions (account, date, description, amount, category, occurrence) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                records,
+            )
+            # Only the rows inserted just now are aggregated; existing totals are updated in place
+            self._conn.execute(
+                """
+                INSERT INTO period_totals (account, period, category, total, count)
+                SELECT account, substr(date, 1, 7), category, SUM(amount), COUNT(*)
+                FROM transactions WHERE account = ? AND rowid > ? GROUP BY 1, 2, 3
+                ON CONFLICT (account, period, category) DO UPDATE
+                SET total = total + excluded.total, count = count + excluded.count
+                """,
+                (self.account, before),
+            )
+            return self._conn.execute(
+                "SELECT COUNT(*) FROM transactions WHERE account = ? AND rowid > ?", (self.account, before)
+            ).fetchone()[0]
+
+    def relabel(self, label):
+        """Re-categorise this account's Uncategorised rows and rebuild its period totals.
+
+        ``label`` maps a Series of descriptions to categories (NaN where it has none), e.g.
+        ``MerchantCategorizer.label`` once the agent has labelled the leftovers.
+        """
+        with self._lock, self._conn:
+            descriptions = [
+                row[0]
+                for row in self._conn.execute(
+                    "SELECT DISTINCT description FROM transactions WHERE account = ? AND category = ?",
+                    (self.account, UNCATEGORISED),
+                )
+            ]
+            labels = label(pd.Series(descriptions, dtype="object")) if descriptions else pd.Series(dtype="object")
+            updates = [
+                (category, self.account, description, UNCATEGORISED)
+                for description, category in zip(descriptions, labels)
+                if pd.notna(category)
+            ]
+            if not updates:
+                return 0
+            self._conn.executemany(
+                "UPDATE transactions SET category = ? WHERE account = ? AND description = ? AND category = ?", updates
+            )
+            self._conn.execute("DELETE FROM period_totals WHERE account = ?", (self.account,))
+            self._conn.execute(
+                """
+                INSERT INTO period_totals (account, period, category, total, count)
+                SELECT account, substr(date, 1, 7), category, SUM(amount), COUNT(*)
+                FROM transactions WHERE account = ? GROUP BY 1, 2, 3
+                """,
+                (self.account,),
+            )
+            return len(updates)
+
+    def summary(self):
+        """Overall monthly summary built from the stored totals, without scanning transactions."""
+        with self._lock:
+            totals = pd.read_sql_query(
+                "SELECT period, category, total, count FROM period_totals WHERE account = ?",
+                self._conn,
+                params=(self.account,),
+            )
+            start, end = self._conn.execute(
+                "SELECT MIN(date), MAX(date) FROM transactions WHERE account = ?", (self.account,)
+            ).fetchone()
+        index = pd.MultiIndex.from_arrays(
+            [pd.PeriodIndex(totals["period"], freq="M"), totals["category"]], names=["Period", "Category"]
+        )
+        totals = pd.DataFrame({"sum": totals["total"].to_numpy(), "count": totals["count"].to_numpy()}, index=index)
+        aggregator = SpendingAggregator.from_totals(
+            totals, int(totals["count"].sum()), pd.Timestamp(start), pd.Timestamp(end)
+        )
+        return aggregator.summary()
+
+    def last_report(self):
+        """Return ``(created, last_rowid)`` of the previous report, or ``None`` before the first one."""
+        with self._lock:
+            return self._conn.execute(
+                "SELECT created, last_rowid FROM reports WHERE account = ? ORDER BY id DESC LIMIT 1", (self.account,)
+            ).fetchone()
+
+    def delta_since_last_report(self):
+        """Transactions stored after the previous report, as a Date/Description/Amount/Category frame."""
+        last = self.last_report()
+        with self._lock:
+            return pd.read_sql_query(
+                "SELECT date AS Date, description AS Description, amount AS Amount, category AS Category "
+                "FROM transactions WHERE account = ? AND rowid > ? ORDER BY date",
+                self._conn,
+                params=(self.account, last[1] if last else 0),
+            )
+
+    def record_report(self):
+        """Mark everything stored so far as covered by a report."""
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT INTO reports (account, created, last_rowid) VALUES (?, ?, ?)",
+                (self.account, datetime.now().isoformat(timespec="seconds"), self._max_rowid()),
+            )
+
+
+def format_incremental_history(store):
+    """Prompt text for the Spending History section covering only rows added since the previous report."""
+    last = store.last_report()
+    delta = store.delta_since_last_report()
+    if last is None:
+        return format_summary(summarize_spending(delta))
+    overall = format_summary(store.summary()).split("\n", 1)[0]
+    if delta.empty:
+        return f"Stored history to date: {overall}\n\nNo new transactions since the previous report ({last[0]})."
+    delta_text = format_summary(summarize_spending(delta))
+    return f"Stored history to date: {overall}\n\nNew since the previous report ({last[0]}):\n{delta_text}"
@@ -0,0 +1,44 @@
+import time
+
+from budget_agent import BUDGET_FALLBACK_MODELS
+from dispatcher import PRIORITY_INTERACTIVE, get_dispatcher
+from metrics import metrics
+from resources import get_run_config
+from router import get_router
+
+
+async def stream_text(agent, prompt, run_config=None, priority=PRIORITY_INTERACTIVE, models=None):
+    """Yield text deltas from a streamed agent run as soon as the model emits them.
+
+    The stream goes through the shared dispatcher: it is queued and rate limited together
+    with non-streamed requests, and identical streams already in flight (same agent, run
+    config and prompt) share one run, each reader getting every delta from the start. The
+    router picks the model (by default the agent's, then BUDGET_FALLBACK_MODELS): a stream
+    still silent past the model's usual time to first token is hedged, and errors before the
+    first token fall back to the next model.
+    """
+
+    async def run():
+        started = time.perf_counter()
+        result, deltas = await get_router().start_stream(
+            agent, prompt, run_config or get_run_config(), models=models or [agent.model, *BUDGET_FALLBACK_MODELS]
+        )
+        metrics.observe("first_token_seconds", time.perf_counter() - started)
+        async for delta in deltas:
+            yield delta
+        metrics.record_usage(result.context_wrapper.usage)
+
+    key = ("stream", id(agent), id(run_config) if run_config else None, prompt)
+    async for delta in get_dispatcher().stream(key, run, priority=priority):
+        yield delta
+
+
+def write_stream(deltas, placeholder, render=None):
+    """Write text deltas into a Streamlit placeholder as they arrive and return the full text."""
+    render = render or (lambda text: text)
+    text = ""
+    for delta in deltas:
+        text += delta
+        placeholder.markdown(render(text + "▌"))
+    placeholder.markdown(render(text))
+    return text
@@ -0,0 +1,55 @@
+import numpy as np
+import pandas as pd
+
+
+# (Description, Category, typical amount, relative frequency), modelled on sample_spending_history.csv
+MERCHANTS = [
+    ("Whole Foods Market", "Groceries", 100.0, 4),
+    ("Trader Joe's", "Groceries", 60.0, 3),
+    ("Netflix", "Entertainment", 15.99, 1),
+    ("Spotify", "Entertainment", 9.99, 1),
+    ("Starbucks", "Coffee Shops", 6.75, 8),
+    ("Uber", "Transport", 16.0, 3),
+    ("Lyft", "Transport", 10.5, 2),
+    ("Gas Station – Shell", "Transport", 49.0, 2),
+    ("Electricity Bill", "Utilities", 98.0, 1),
+    ("Internet Bill", "Utilities", 60.0, 1),
+    ("Chipotle", "Dining Out", 13.5, 2),
+    ("Uber Eats", "Dining Out", 30.0, 2),
+    ("Sushi Restaurant", "Dining Out", 70.0, 1),
+    ("Amazon", "Shopping", 40.0, 3),
+    ("Gym Membership", "Health & Fitness", 40.0, 1),
+    ("Pharmacy – CVS", "Health & Fitness", 20.0, 1),
+    ("H&M", "Clothing", 65.0, 1),
+    ("Amazon Prime", "Subscriptions", 14.99, 1),
+    ("Apple App Store", "Subscriptions", 4.99, 1),
+    ("Rent", "Housing", 1400.0, 1),
+]
+
+# Roughly the density of the sample file; longer histories are packed more densely past the cap
+TRANSACTIONS_PER_DAY = 1.5
+MAX_SPAN_DAYS = 20 * 365
+
+
+def generate_history(rows, start="2020-01-01", seed=0):
+    """Generate ``rows`` synthetic transactions with the Date/Description/Amount/Category schema."""
+    rng = np.random.default_rng(seed)
+    descriptions, categories, amounts, weights = (np.array(column) for column in zip(*MERCHANTS))
+    weights = weights.astype(float) / weights.astype(float).sum()
+
+    merchant = rng.choice(len(MERCHANTS), size=rows, p=weights)
+    typical = amounts.astype(float)[merchant]
+    amount = np.round(np.abs(rng.normal(typical, typical * 0.15)), 2)
+
+    span_days = int(min(MAX_SPAN_DAYS, max(30, rows / TRANSACTIONS_PER_DAY)))
+    offsets = np.sort(rng.integers(0, span_days, size=rows))
+    dates = pd.Timestamp(start) + pd.to_timedelta(offsets, unit="D")
+
+    return pd.DataFrame(
+        {
+            "Date": dates.strftime("%Y-%m-%d"),
+            "Description": descriptions[merchant],
+            "Amount": amount,
+            "Category": categories[merchant],
+        }
+    )
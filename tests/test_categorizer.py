@@ -0,0 +1,23 @@
+import pandas as pd
+import pytest
+
+pytest.importorskip("agents")
+
+from categorizer import MerchantCategorizer  # noqa: E402
+
+
+def test_exact_rules_win_over_keywords():
+    categorizer = MerchantCategorizer(rules={"Uber Eats Downtown": "Dining Out", "UBER *TRIP 42": "Travel"})
+    labels = categorizer.label(pd.Series(["UBER EATS DOWNTOWN", "uber *trip 42", "Uber ride", "Starbucks #5", "??"]))
+    assert labels.tolist()[:4] == ["Dining Out", "Travel", "Transport", "Coffee Shops"]
+    assert pd.isna(labels.iloc[4])
+
+
+def test_learned_rules_scale_with_unique_descriptions():
+    descriptions = [f"POS PURCHASE {i} STORE #{i * 7}" for i in range(20_000)]
+    categorizer = MerchantCategorizer().learn(pd.DataFrame({"Description": descriptions, "Category": "Shopping"}))
+    assert len(categorizer.rules) == 20_000
+
+    df, unmatched = categorizer.categorize(pd.DataFrame({"Description": descriptions, "Category": None}))
+    assert (df["Category"] == "Shopping").all()
+    assert unmatched == set()
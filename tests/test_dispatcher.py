@@ -0,0 +1,197 @@
+import asyncio
+
+import pytest
+
+from dispatcher import PRIORITY_BATCH, Dispatcher
+
+
+def run(coro, timeout=5):
+    return asyncio.run(asyncio.wait_for(coro, timeout))
+
+
+@pytest.mark.parametrize("max_in_flight,max_queue", [(1, 1), (2, 1), (1, 3)])
+def test_back_pressure_drains_fast_calls(max_in_flight, max_queue):
+    dispatcher = Dispatcher(max_in_flight=max_in_flight, max_queue=max_queue, requests_per_minute=0)
+
+    async def call():
+        await asyncio.sleep(0)
+        return "ok"
+
+    async def main():
+        return await asyncio.gather(*(dispatcher.submit(index, call) for index in range(10)))
+
+    assert run(main()) == ["ok"] * 10
+    assert dispatcher.stats()["queue_depth"] == 0
+    assert dispatcher.stats()["in_flight"] == 0
+
+
+def test_back_pressure_failing_calls_release_their_slots():
+    dispatcher = Dispatcher(max_in_flight=1, max_queue=1, requests_per_minute=0)
+
+    async def fail():
+        raise ConnectionError("provider down")
+
+    async def main():
+        calls = (dispatcher.submit(index, fail) for index in range(10))
+        return await asyncio.gather(*calls, return_exceptions=True)
+
+    results = run(main())
+    assert all(isinstance(result, ConnectionError) for result in results)
+    assert dispatcher.stats()["in_flight"] == 0
+
+
+def test_identical_requests_are_coalesced():
+    dispatcher = Dispatcher(requests_per_minute=0)
+    calls = []
+
+    async def call():
+        calls.append(1)
+        await asyncio.sleep(0.01)
+        return "report"
+
+    async def main():
+        return await asyncio.gather(*(dispatcher.submit("same prompt", call) for _ in range(5)))
+
+    assert run(main()) == ["report"] * 5
+    assert len(calls) == 1
+    assert dispatcher.coalesced == 4
+
+
+def test_interactive_requests_run_before_queued_batch_work():
+    dispatcher = Dispatcher(max_in_flight=1, requests_per_minute=0)
+    order = []
+
+    def call(name):
+        async def make_call():
+            order.append(name)
+            await asyncio.sleep(0.01)
+
+        return make_call
+
+    async def main():
+        first = asyncio.ensure_future(dispatcher.submit("running", call("running")))
+        await asyncio.sleep(0)
+        batch = [
+            asyncio.ensure_future(dispatcher.submit(f"batch{i}", call(f"batch{i}"), PRIORITY_BATCH)) for i in range(2)
+        ]
+        await asyncio.sleep(0)
+        interactive = asyncio.ensure_future(dispatcher.submit("interactive", call("interactive")))
+        await asyncio.gather(first, *batch, interactive)
+
+    run(main())
+    assert order == ["running", "interactive", "batch0", "batch1"]
+
+
+def test_token_bucket_spaces_requests_beyond_the_burst():
+    dispatcher = Dispatcher(requests_per_minute=600, burst=2)
+    loop_times = []
+
+    async def call():
+        loop_times.append(asyncio.get_running_loop().time())
+
+    async def main():
+        await asyncio.gather(*(dispatcher.submit(index, call) for index in range(4)))
+
+    run(main())
+    # Two requests fit the burst; the next two wait ~0.1s each for a token at 10 requests/second
+    assert loop_times[-1] - loop_times[0] >= 0.15
+
+
+def test_try_acquire_only_takes_spare_capacity():
+    dispatcher = Dispatcher(max_in_flight=2, requests_per_minute=60, burst=2)
+
+    async def main():
+        async with dispatcher.slot():
+            assert dispatcher.try_acquire()  # one slot and one token left
+            assert not dispatcher.try_acquire()  # no slot left
+            dispatcher.release()
+            assert not dispatcher.try_acquire()  # a slot, but the bucket is empty
+        assert dispatcher.in_flight == 0
+
+    run(main())
+
+
+def test_rate_limited_batch_work_does_not_hold_slots_ahead_of_interactive():
+    dispatcher = Dispatcher(max_in_flight=20, requests_per_minute=6000, burst=1)
+    started = []
+
+    async def call(name):
+        started.append(name)
+        await asyncio.sleep(0.01)
+
+    async def main():
+        batch = [
+            asyncio.ensure_future(dispatcher.submit(i, lambda i=i: call(i), priority=PRIORITY_BATCH)) for i in range(60)
+        ]
+        await asyncio.sleep(0.1)
+        before = len(started)
+        await dispatcher.submit("interactive", lambda: call("interactive"))
+        await asyncio.gather(*batch)
+        return before
+
+    before = run(main())
+    # Slots are not held while waiting for tokens, so the interactive request gets the next token
+    assert started.index("interactive") <= before + 1
+    assert dispatcher.in_flight == 0
+
+
+def test_cancelled_waiters_leave_the_queue():
+    dispatcher = Dispatcher(max_in_flight=1, requests_per_minute=0)
+
+    async def queued():
+        async with dispatcher.slot():
+            pass
+
+    async def main():
+        async with dispatcher.slot():
+            waiter = asyncio.ensure_future(queued())
+            await asyncio.sleep(0)
+            assert dispatcher.depth == 1
+            waiter.cancel()
+            await asyncio.sleep(0)
+        assert await dispatcher.submit("b", lambda: asyncio.sleep(0, "ok")) == "ok"
+
+    run(main())
+    assert dispatcher.stats()["queue_depth"] == 0
+    assert dispatcher.in_flight == 0
+
+
+def test_identical_streams_share_one_run():
+    dispatcher = Dispatcher(requests_per_minute=0)
+    runs = []
+
+    async def produce():
+        runs.append(1)
+        for word in ("a", "b", "c"):
+            await asyncio.sleep(0.01)
+            yield word
+
+    async def read(delay=0):
+        await asyncio.sleep(delay)
+        return [item async for item in dispatcher.stream("report", produce)]
+
+    async def main():
+        return await asyncio.gather(read(), read(0.015))  # the second joins after the first item
+
+    assert run(main()) == [["a", "b", "c"], ["a", "b", "c"]]
+    assert len(runs) == 1
+    assert dispatcher.coalesced == 1
+    assert dispatcher.in_flight == 0
+
+
+def test_stream_errors_reach_every_reader():
+    dispatcher = Dispatcher(requests_per_minute=0)
+
+    async def produce():
+        yield "a"
+        await asyncio.sleep(0.01)
+        raise ConnectionError("dropped")
+
+    async def read():
+        return [item async for item in dispatcher.stream("report", produce)]
+
+    async def main():
+        return await asyncio.gather(read(), read(), return_exceptions=True)
+
+    assert [type(result) for result in run(main())] == [ConnectionError, ConnectionError]
+    assert dispatcher.in_flight == 0
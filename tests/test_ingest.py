@@ -0,0 +1,97 @@
+import io
+
+import pytest
+
+pytest.importorskip("agents")
+
+import ingest  # noqa: E402
+from store import TransactionStore  # noqa: E402
+
+
+CSV = """Date,Description,Amount,Category
+2024-01-05,Starbucks,6.75,
+2024-01-07,ACME WIDGETS,40.00,
+2024-01-09,Whole Foods,95.00,Groceries
+"""
+
+
+@pytest.fixture
+def passes(monkeypatch):
+    calls = []
+    ingest_csv = ingest.ingest_csv
+
+    def counting_ingest_csv(source, *args, **kwargs):
+        calls.append(kwargs.get("store"))
+        return ingest_csv(source, *args, **kwargs)
+
+    monkeypatch.setattr(ingest, "ingest_csv", counting_ingest_csv)
+    return calls
+
+
+def agent_labels(rules):
+    async def categorize_with_agent(descriptions, categories=(), priority=0):
+        return {description: rules[description] for description in descriptions if description in rules}
+
+    return categorize_with_agent
+
+
+def test_agent_labels_are_applied_and_stored_rows_relabelled(tmp_path, monkeypatch, passes):
+    monkeypatch.setattr(ingest, "categorize_with_agent", agent_labels({"ACME WIDGETS": "Hardware"}))
+    store = TransactionStore(str(tmp_path / "store.sqlite3"))
+
+    history = ingest.ingest_with_categories(io.StringIO(CSV), store=store)
+    assert history["new_rows"] == 3
+    assert history["summary"]["by_category"]["total"].to_dict() == {
+        "Coffee Shops": 6.75,
+        "Groceries": 95.0,
+        "Hardware": 40.0,
+    }
+    assert store.summary()["by_category"]["total"].to_dict() == history["summary"]["by_category"]["total"].to_dict()
+    assert passes == [store, None]  # only the first pass writes to the store
+
+
+def test_one_pass_when_the_agent_labels_nothing(tmp_path, monkeypatch, passes):
+    monkeypatch.setattr(ingest, "categorize_with_agent", agent_labels({}))
+    store = TransactionStore(str(tmp_path / "store.sqlite3"))
+
+    history = ingest.ingest_with_categories(io.StringIO(CSV), store=store)
+    assert len(passes) == 1
+    assert history["new_rows"] == 3
+    assert "Uncategorised" in history["summary"]["by_category"].index
+
+
+def test_agent_failure_keeps_the_local_labels(tmp_path, monkeypatch):
+    async def rate_limited(descriptions, categories=(), priority=0):
+        raise ConnectionError("429 Too Many Requests")
+
+    monkeypatch.setattr(ingest, "categorize_with_agent", rate_limited)
+    store = TransactionStore(str(tmp_path / "store.sqlite3"))
+
+    history = ingest.ingest_with_categories(io.StringIO(CSV), store=store)
+    assert history["summary"]["by_category"]["total"].to_dict() == {
+        "Coffee Shops": 6.75,
+        "Groceries": 95.0,
+        "Uncategorised": 40.0,
+    }
+    assert history["new_rows"] == 3
+    assert "429" in history["warnings"][0]
+
+
+def test_batch_prompts_send_leftovers_to_the_agent(tmp_path, monkeypatch):
+    batch = pytest.importorskip("batch")
+    from dispatcher import PRIORITY_BATCH
+
+    seen = []
+
+    async def categorize_with_agent(descriptions, categories=(), priority=0):
+        seen.append(priority)
+        return {"ACME WIDGETS": "Hardware"}
+
+    monkeypatch.setattr(ingest, "categorize_with_agent", categorize_with_agent)
+    path = tmp_path / "customer.csv"
+    path.write_text(CSV)
+
+    prompt = batch.prompt_for_file(path)
+    assert "Hardware" in prompt
+    assert "Uncategorised" not in prompt
+    assert seen == [PRIORITY_BATCH]
@@ -0,0 +1,37 @@
+import pandas as pd
+
+from patterns import PatternAccumulator, detect_patterns
+from prompt_planner import parse_history_text
+from synthetic import generate_history
+
+
+def test_chunked_findings_match_whole_frame():
+    history = generate_history(20_000)
+    end = pd.to_datetime(history["Date"]).max()
+    subscription = pd.DataFrame(
+        {
+            "Date": pd.date_range(end - pd.Timedelta(days=400), end, freq="MS").strftime("%Y-%m-%d"),
+            "Description": " Hulu ",
+            "Amount": 17.99,
+            "Category": "Entertainment",
+        }
+    )
+    history = pd.concat([history, subscription], ignore_index=True).sample(frac=1, random_state=1)
+
+    accumulator = PatternAccumulator()
+    for start in range(0, len(history), 3_000):
+        accumulator.update(history.iloc[start : start + 3_000])
+
+    expected = detect_patterns(history, limit=50)
+    assert any(finding["subject"] == "Hulu" for finding in expected)
+    assert [f["text"] for f in accumulator.findings(limit=50)] == [f["text"] for f in expected]
+
+
+def test_empty_accumulator_has_no_findings():
+    assert PatternAccumulator().findings() == []
+
+
+def test_pasted_history_without_description_or_category():
+    pasted = parse_history_text("Date,Amount\n2024-01-01,5\n2024-02-01,5\n2024-03-01,5\n2024-04-01,5")
+    findings = detect_patterns(pasted)
+    assert findings == PatternAccumulator().update(pasted).findings()
@@ -0,0 +1,27 @@
+import pytest
+
+from prompt_planner import line_value, truncate_low_value
+
+
+@pytest.mark.parametrize(
+    "line,value",
+    [
+        ("2024-01-05, Starbucks, $6.50", 6.50),
+        ("- 2025-01: total 150.00", 150.00),
+        ("401k match – $200", 200.00),
+        ("01/05/2024 Uber 12.40", 12.40),
+        ("Rent 1,200", 1200.00),
+        ("Monthly Salary – $4,500", 4500.00),
+        ("Netflix (x3)", 0.0),
+    ],
+)
+def test_line_value_ignores_dates_and_glued_digits(line, value):
+    assert line_value(line) == value
+
+
+def test_truncate_low_value_drops_the_cheapest_rows_first():
+    lines = [f"2024-01-{day:02d}, Shop {day}, ${day * 10}.00" for day in range(1, 21)]
+    kept = truncate_low_value("\n".join(lines), max_tokens=len("\n".join(lines)) // 8).split("\n")
+    assert "Shop 20" in kept[-2]
+    assert not any("Shop 1," in line for line in kept)
+    assert kept[-1].endswith("lower-value lines omitted")
@@ -0,0 +1,30 @@
+import pandas as pd
+import pytest
+
+pytest.importorskip("agents")
+
+from analytics import summarize_spending  # noqa: E402
+from report_pipeline import budget_overview  # noqa: E402
+
+
+def history(rows):
+    return summarize_spending(pd.DataFrame(rows, columns=["Date", "Description", "Amount", "Category"]))
+
+
+def test_overview_uses_the_latest_complete_period():
+    summary = history(
+        [
+            ("2024-02-01", "Rent", 1000.0, "Housing"),
+            ("2024-02-20", "Whole Foods", 160.0, "Groceries"),
+            ("2024-03-02", "Starbucks", 5.0, "Coffee Shops"),  # March has barely started
+        ]
+    )
+    table, figures = budget_overview("Monthly Salary – $4,000\n401k match – $200", "", summary)
+    assert table.startswith("Period: 2024-02 (latest complete period)")
+    assert figures == {"income": 4200.0, "expenses": 1160.0, "net": 3040.0}
+
+
+def test_overview_labels_a_partial_only_period():
+    table, figures = budget_overview("Salary – $4,000", "", history([("2024-03-02", "Starbucks", 5.0, "Coffee Shops")]))
+    assert table.startswith("Period: 2024-03 (partial, 2024-03-02 to 2024-03-02)")
+    assert figures["expenses"] == 5.0
@@ -0,0 +1,180 @@
+import asyncio
+import time
+
+import pytest
+
+pytest.importorskip("agents")
+
+from agents import Agent, RunConfig  # noqa: E402
+
+from dispatcher import Dispatcher  # noqa: E402
+from metrics import metrics  # noqa: E402
+from mock_provider import MockModelProvider  # noqa: E402
+from router import ModelRouter  # noqa: E402
+
+
+AGENT = "Router Test"
+MODELS = ["primary", "backup"]
+
+
+def run(coro, timeout=10):
+    return asyncio.run(asyncio.wait_for(coro, timeout))
+
+
+def make_router(dispatcher, primary_p95=0.05):
+    """A router that already knows the primary's tail latency, so it hedges after ``primary_p95``."""
+    router = ModelRouter(min_samples=3, dispatcher=dispatcher)
+    for _ in range(3):
+        router.latency[(AGENT, "primary")].observe(primary_p95)
+    return router
+
+
+def run_config(**kwargs):
+    provider = MockModelProvider(**{"latency": 0.02, "tokens_per_second": 10_000.0, "output_tokens": 8, **kwargs})
+    return RunConfig(model_provider=provider)
+
+
+def agent():
+    return Agent(name=AGENT, instructions="Write a short report.", model="primary")
+
+
+def counters(*names):
+    return [metrics.counters[name] for name in names]
+
+
+def test_hedge_wins_and_the_slow_primary_is_cancelled():
+    dispatcher = Dispatcher(requests_per_minute=0)
+    router = make_router(dispatcher)
+    before = counters("model_hedges", "model_hedge_wins", "model_errors")
+
+    async def main():
+        started = time.perf_counter()
+        result = await router.run(agent(), "hello", run_config(model_latency={"primary": 1.0}), models=MODELS)
+        elapsed = time.perf_counter() - started
+        await asyncio.sleep(1.2)  # long enough for the primary to have finished had it not been cancelled
+        return result, elapsed
+
+    result, elapsed = run(main())
+    assert result.final_output
+    assert elapsed < 0.5
+    assert counters("model_hedges", "model_hedge_wins", "model_errors") == [before[0] + 1, before[1] + 1, before[2]]
+    # The cancelled primary is kept as a censored sample at its elapsed time, not dropped
+    assert router.latency[(AGENT, "primary")].count == 4
+    assert 0.05 <= router.latency[(AGENT, "primary")].percentiles((1.0,))[1.0] < 0.5
+    assert router.latency[(AGENT, "backup")].count == 1
+    assert dispatcher.in_flight == 0  # the hedge gave its slot back
+
+
+def test_primary_beats_its_hedge_and_the_hedge_is_cancelled():
+    dispatcher = Dispatcher(requests_per_minute=0)
+    router = make_router(dispatcher)
+    before = counters("model_hedges", "model_hedge_wins")
+
+    async def main():
+        config = run_config(model_latency={"primary": 0.15, "backup": 1.0})
+        result = await router.run(agent(), "hello", config, models=MODELS)
+        await asyncio.sleep(1.2)
+        return result
+
+    assert run(main()).final_output
+    assert counters("model_hedges", "model_hedge_wins") == [before[0] + 1, before[1]]
+    assert router.latency[(AGENT, "backup")].count == 0
+    assert dispatcher.in_flight == 0
+
+
+def test_errors_fall_back_to_the_next_model():
+    dispatcher = Dispatcher(requests_per_minute=60, burst=2)
+    router = ModelRouter(dispatcher=dispatcher)
+    before = counters("model_fallback_wins", "model_errors")
+
+    result = run(router.run(agent(), "hello", run_config(failing_models=["primary"]), models=MODELS))
+    assert result.final_output
+    assert counters("model_fallback_wins", "model_errors") == [before[0] + 1, before[1] + 1]
+    assert dispatcher.bucket.tokens < 1.5  # the fallback took a rate-limit token
+
+
+@pytest.mark.parametrize(
+    "dispatcher",
+    [Dispatcher(max_in_flight=1, requests_per_minute=0), Dispatcher(requests_per_minute=1, burst=1)],
+    ids=["no-free-slot", "no-rate-token"],
+)
+def test_hedge_is_skipped_without_spare_dispatcher_capacity(dispatcher):
+    router = make_router(dispatcher)
+    before = counters("model_hedges", "model_hedges_skipped")
+
+    async def main():
+        config = run_config(latency=0.05, slow_fractions={"primary": 1.0}, slow_factor=6.0)
+        async with dispatcher.slot():
+            return await router.run(agent(), "hello", config, models=MODELS)
+
+    assert run(main()).final_output
+    assert counters("model_hedges", "model_hedges_skipped") == [before[0], before[1] + 1]
+    assert router.latency[(AGENT, "backup")].count == 0
+    assert dispatcher.in_flight == 0
+
+
+def test_timeouts_are_sampled_and_failing_models_are_tried_last():
+    router = ModelRouter(hedge_quantile=None, timeout=0.1, dispatcher=Dispatcher(requests_per_minute=0))
+    config = run_config(model_latency={"primary": 1.0})
+
+    async def main():
+        for _ in range(3):
+            assert (await router.run(agent(), "hello", config, models=MODELS)).final_output
+        started = time.perf_counter()
+        await router.run(agent(), "hello", config, models=MODELS)
+        return time.perf_counter() - started
+
+    # Once demoted, the timing-out primary no longer costs every request a full timeout
+    assert run(main()) < 0.1
+    assert router.latency[(AGENT, "primary")].count == 3
+    assert router.latency[(AGENT, "primary")].percentiles((0.0,))[0.0] >= 0.1
+    assert router.error_rate(AGENT, "primary") == 1.0
+    assert router.order(AGENT, MODELS) == ["backup", "primary"]
+
+
+def test_erroring_models_are_demoted():
+    router = ModelRouter(dispatcher=Dispatcher(requests_per_minute=0))
+    config = run_config(failing_models=["primary"])
+    run(router.run(agent(), "hello", config, models=MODELS))
+    assert router.order(AGENT, MODELS) == MODELS  # one error is not enough to move traffic
+    for _ in range(2):
+        run(router.run(agent(), "hello", config, models=MODELS))
+    assert router.order(AGENT, MODELS) == ["backup", "primary"]
+    assert router.stats()[f"{AGENT} / backup"]["errors"] == 0
+
+
+async def read_stream(router, config, primary_ttft_p95=None):
+    if primary_ttft_p95 is not None:
+        for _ in range(3):
+            router.latency[(f"{AGENT} (stream)", "primary")].observe(primary_ttft_p95)
+    result, deltas = await router.start_stream(agent(), "hello", config, models=MODELS)
+    text = "".join([delta async for delta in deltas])
+    return result, text
+
+
+def test_streams_fall_back_before_the_first_token():
+    router = ModelRouter(min_samples=3, dispatcher=Dispatcher(requests_per_minute=0))
+    before = counters("model_fallback_wins")
+
+    result, text = run(read_stream(router, run_config(failing_models=["primary"])))
+    assert "## Budget Overview" in text
+    assert result.is_complete
+    assert counters("model_fallback_wins") == [before[0] + 1]
+
+
+def test_silent_streams_are_hedged_on_time_to_first_token():
+    dispatcher = Dispatcher(requests_per_minute=0)
+    router = ModelRouter(min_samples=3, dispatcher=dispatcher)
+    before = counters("model_hedge_wins")
+
+    async def main():
+        started = time.perf_counter()
+        _, text = await read_stream(router, run_config(model_latency={"primary": 1.0}), primary_ttft_p95=0.05)
+        return text, time.perf_counter() - started
+
+    text, elapsed = run(main())
+    assert "## Budget Overview" in text
+    assert elapsed < 0.5
+    assert counters("model_hedge_wins") == [before[0] + 1]
+    assert router.latency[(f"{AGENT} (stream)", "backup")].count == 1
+    assert dispatcher.in_flight == 0
@@ -0,0 +1,52 @@
+import pandas as pd
+
+from store import TransactionStore
+
+
+def frame(rows):
+    return pd.DataFrame(rows, columns=["Date", "Description", "Amount", "Category"])
+
+
+COFFEE = ("2024-01-05", "Starbucks", 6.75, "Coffee Shops")
+GROCERIES = ("2024-01-06", "Whole Foods", 95.0, "Groceries")
+
+
+def test_accounts_never_see_each_others_rows(tmp_path):
+    store = TransactionStore(str(tmp_path / "store.sqlite3"))
+    alice, bob = store.for_account("user:alice"), store.for_account("user:bob")
+
+    assert alice.add(frame([COFFEE, GROCERIES])) == 2
+    assert bob.add(frame([COFFEE])) == 1  # the same row in another account is new there
+    alice.record_report()
+
+    assert bob.delta_since_last_report()["Description"].tolist() == ["Starbucks"]
+    assert bob.last_report() is None
+    assert bob.summary()["total"] == 6.75
+    assert alice.summary()["total"] == 101.75
+    assert alice.delta_since_last_report().empty
+
+
+def test_repeat_purchases_are_kept_and_reuploads_deduplicated(tmp_path):
+    store = TransactionStore(str(tmp_path / "store.sqlite3"))
+    upload = frame([COFFEE, COFFEE, GROCERIES])
+
+    assert store.add(upload) == 3
+    assert store.add(upload) == 0
+
+    # One upload split across chunks numbers its repeats consistently
+    occurrences = {}
+    assert store.add(upload.iloc[:1], occurrences) + store.add(upload.iloc[1:], occurrences) == 0
+    assert store.add(frame([COFFEE, COFFEE, COFFEE])) == 1
+    assert store.summary()["total"] == 3 * 6.75 + 95.0
+
+
+def test_relabel_moves_uncategorised_rows_and_their_totals(tmp_path):
+    store = TransactionStore(str(tmp_path / "store.sqlite3"))
+    store.add(frame([("2024-01-07", "ACME WIDGETS", 40.0, None), COFFEE]))
+    other = store.for_account("user:other")
+    other.add(frame([("2024-01-07", "ACME WIDGETS", 40.0, None)]))
+
+    assert store.relabel(lambda descriptions: descriptions.map({"ACME WIDGETS": "Hardware"})) == 1
+    by_category = store.summary()["by_category"]["total"].to_dict()
+    assert by_category == {"Coffee Shops": 6.75, "Hardware": 40.0}
+    assert other.summary()["by_category"].index.tolist() == ["Uncategorised"]